@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+import asyncio
+import hmac
+from core.profiler import folded_text, profile_store, sample_process
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger("api.admin")
+
+def require_admin(x_admin_token: str | None = Header(None)):
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled; set ADMIN_TOKEN to enable it")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode("utf-8"), settings.ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+# One on-demand profile at a time; each one holds a worker thread for its whole duration
+_profile_lock = asyncio.Lock()
+
+@router.post("/profile")
+async def profile_process(seconds: float = 10.0, interval_ms: float = 10.0):
+    """
+    Sample the stacks of every thread in the process for `seconds` and save the result
+    """
+    if not 0 < seconds <= settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {settings.PROFILE_MAX_SECONDS}")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 1000")
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    
+    async with _profile_lock:
+        logger.info("🔬 Profiling process for %ss", seconds)
+        stacks = await asyncio.to_thread(sample_process, seconds, interval_ms / 1000)
+    capture = profile_store.add("sample", f"process {seconds:g}s", seconds * 1000, {"interval_ms": interval_ms}, stacks)
+    return {key: value for key, value in capture.items() if key != "stacks"}
+
+@router.get("/profiles")
+def list_profiles():
+    """
+    Saved captures, newest first: on-demand samples and slow workflow runs and uploads
+    """
+    return {"slow_run_ms": profile_store.slow_run_ms, "profiles": profile_store.list()}
+
+@router.get("/profiles/{capture_id}")
+def get_profile(capture_id: int):
+    return _get_capture(capture_id)
+
+@router.get("/profiles/{capture_id}/folded", response_class=PlainTextResponse)
+def download_profile(capture_id: int):
+    """
+    Sampled stacks in folded format, for flamegraph.pl or speedscope
+    """
+    capture = _get_capture(capture_id)
+    return PlainTextResponse(
+        folded_text(capture),
+        headers={"Content-Disposition": f'attachment; filename="profile-{capture_id}.folded"'}
+    )
+
+def _get_capture(capture_id: int) -> dict:
+    capture = profile_store.get(capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail=f"Profile {capture_id} not found")
+    return capture
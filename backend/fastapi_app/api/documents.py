@@ -1,10 +1,21 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import glob
+import hashlib
 import os
 import uuid
+import weakref
 from utils.config import settings
-from core.text_extractor import extract_text_from_pdf, chunk_text
-from core.embeddings import embed_texts
-from core.vectorstore import add_document_chunks
+from core.document_ingest import ingest_document
+from core.profiler import profile_store
+from core.tracing import Trace, bind
+from core.vectorstore import EmbedderUnavailable, EmbeddingSpaceMismatch, delete_document_chunks
+from db.database import get_async_db
+from db.document_compactor import STAGING_PREFIX, document_compactor
+from db.models import Document
 from utils.logger import get_logger
 
 router = APIRouter()
@@ -12,54 +23,205 @@ logger = get_logger("api.documents")
 
 os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
 
-@router.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No filename provided")
-    
-    filename = file.filename.lower()
-    if not (filename.endswith(".pdf") or filename.endswith(".txt")):
-        raise HTTPException(status_code=400, detail="Only PDF or TXT files allowed")
+# One in-flight replace/delete per document; entries disappear once no request holds them
+_document_locks = weakref.WeakValueDictionary()
 
+def _document_lock(file_id: str) -> asyncio.Lock:
+    lock = _document_locks.get(file_id)
+    if lock is None:
+        lock = _document_locks[file_id] = asyncio.Lock()
+    return lock
+
+@router.post("/upload")
+async def upload_document(file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
     file_id = str(uuid.uuid4())
-    save_path = os.path.join(settings.UPLOAD_FOLDER, f"{file_id}_{file.filename}")
-    
+    save_path, is_pdf = _upload_path(file, file_id)
+    trace = Trace()
+
+    # Recorded before anything is written, so compaction can clean up after an interrupted upload
+    document = Document(file_id=file_id, filename=file.filename, path=save_path, status="pending")
+    db.add(document)
+    await db.commit()
+
     try:
-        content = await file.read()
-        with open(save_path, "wb") as f:
-            f.write(content)
-        logger.info(f"Saved uploaded file to {save_path}")
-
-        if filename.endswith(".pdf"):
-            text = extract_text_from_pdf(save_path)
-        else:
-            text = content.decode("utf-8")
-        
-        if not text.strip():
+        size, sha256 = await run_in_threadpool(bind(_save_upload, trace), file.file, save_path)
+        logger.info("Saved uploaded file to %s (%s bytes)", save_path, size)
+
+        stats = await run_in_threadpool(bind(ingest_document, trace), save_path, is_pdf, file_id, file.filename)
+        logger.info("Created %s chunks from document", stats["chunks"])
+
+        if not stats["chunks"]:
             raise HTTPException(status_code=400, detail="File appears to be empty or could not be processed")
-        
-        # Process and chunk the text
-        chunks = chunk_text(text, chunk_size=800, overlap=80)
-        logger.info(f"Created {len(chunks)} chunks from document")
-        
-        if not chunks:
-            raise HTTPException(status_code=400, detail="No text content could be extracted from file")
-        
-        # Generate embeddings and store in vector database
-        embeddings = embed_texts(chunks)
-        metas = [{"source": file.filename, "chunk_index": i, "file_id": file_id} for i in range(len(chunks))]
-        
-        add_document_chunks(doc_id=file_id, chunks=chunks, embeddings=embeddings, metas=metas)
-        
+
+        document.sha256 = sha256
+        document.size_bytes = size
+        document.chunk_count = stats["chunks"]
+        document.status = "ready"
+        await db.commit()
+
         return {
-            "message": "File uploaded and processed successfully", 
-            "file_id": file_id, 
-            "chunks": len(chunks),
-            "filename": file.filename
+            "message": "File uploaded and processed successfully",
+            "file_id": file_id,
+            "chunks": stats["chunks"],
+            "filename": file.filename,
+            "size_bytes": size,
+            "sha256": sha256
         }
-        
+
     except Exception as e:
-        logger.error(f"Error processing file: {str(e)}")
-        if os.path.exists(save_path):
-            os.remove(save_path)
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
\ No newline at end of file
+        # Whatever was indexed before the failure goes too, so nothing is left half-ingested
+        await run_in_threadpool(delete_document_chunks, file_id)
+        _remove_file(save_path)
+        await db.rollback()
+        await db.delete(document)
+        await db.commit()
+        raise _ingest_error(e)
+    finally:
+        profile_store.capture_slow_run("document_upload", file.filename, trace, {"file_id": file_id})
+
+@router.get("")
+async def list_documents(limit: int = 100, offset: int = 0, db: AsyncSession = Depends(get_async_db)):
+    """
+    List ingested documents
+    """
+    result = await db.execute(select(Document).order_by(Document.id).limit(limit).offset(offset))
+    return {"documents": [document.to_dict() for document in result.scalars()]}
+
+@router.put("/{file_id}")
+async def replace_document(file_id: str, file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
+    """
+    Replace a document's file and reindex only the chunks whose text changed
+    """
+    async with _document_lock(file_id):
+        document = await _get_document(db, file_id)
+        old_path = document.path if document else _find_upload(file_id)
+        if document is None and old_path is None:
+            raise HTTPException(status_code=404, detail=f"Document {file_id} not found")
+
+        save_path, is_pdf = _upload_path(file, file_id)
+        # Write beside the current file so a failed replace leaves the old one in place
+        staging_path = os.path.join(settings.UPLOAD_FOLDER, f"{STAGING_PREFIX}{uuid.uuid4().hex}_{os.path.basename(file.filename)}")
+        trace = Trace()
+        try:
+            size, sha256 = await run_in_threadpool(bind(_save_upload, trace), file.file, staging_path)
+
+            if document is not None and document.sha256 == sha256 and document.filename == file.filename:
+                _remove_file(staging_path)
+                logger.info("Document %s unchanged, skipping reindex", file_id)
+                return {"message": "Document unchanged", "file_id": file_id, "chunks": document.chunk_count, "sha256": sha256}
+
+            stats = await run_in_threadpool(bind(ingest_document, trace), staging_path, is_pdf, file_id, file.filename)
+            if not stats["chunks"]:
+                raise HTTPException(status_code=400, detail="File appears to be empty or could not be processed")
+        except Exception as e:
+            _remove_file(staging_path)
+            raise _ingest_error(e)
+        finally:
+            profile_store.capture_slow_run("document_replace", file.filename, trace, {"file_id": file_id})
+
+        os.replace(staging_path, save_path)
+        if old_path and old_path != save_path:
+            _remove_file(old_path)
+
+        if document is None:
+            document = Document(file_id=file_id)
+            db.add(document)
+        document.status = "ready"
+        document.filename = file.filename
+        document.path = save_path
+        document.sha256 = sha256
+        document.size_bytes = size
+        document.chunk_count = stats["chunks"]
+        await db.commit()
+
+        return {
+            "message": "Document replaced and reindexed",
+            "file_id": file_id,
+            "filename": file.filename,
+            "size_bytes": size,
+            "sha256": sha256,
+            **stats
+        }
+
+@router.delete("/{file_id}")
+async def delete_document(file_id: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Remove a document's chunks, uploaded file and database row
+    """
+    async with _document_lock(file_id):
+        document = await _get_document(db, file_id)
+        path = document.path if document else _find_upload(file_id)
+
+        removed_chunks = await run_in_threadpool(delete_document_chunks, file_id)
+        if document is None and path is None and not removed_chunks:
+            raise HTTPException(status_code=404, detail=f"Document {file_id} not found")
+
+        if path:
+            _remove_file(path)
+        if document is not None:
+            await db.delete(document)
+            await db.commit()
+
+        logger.info("🗑️ Deleted document %s", file_id)
+        return {"message": "Document deleted", "file_id": file_id, "chunks_removed": removed_chunks}
+
+@router.post("/compact")
+async def compact_documents():
+    """
+    Run orphan compaction now instead of waiting for the background sweep
+    """
+    return await document_compactor.compact()
+
+async def _get_document(db: AsyncSession, file_id: str) -> Document | None:
+    result = await db.execute(select(Document).where(Document.file_id == file_id))
+    return result.scalar_one_or_none()
+
+def _upload_path(file: UploadFile, file_id: str) -> tuple:
+    """Validate an upload's name and size and return (save path, is_pdf)"""
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No filename provided")
+
+    filename = file.filename.lower()
+    if not (filename.endswith(".pdf") or filename.endswith(".txt")):
+        raise HTTPException(status_code=400, detail="Only PDF or TXT files allowed")
+    if file.size is not None and file.size > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {settings.MAX_UPLOAD_BYTES} byte upload limit")
+
+    return os.path.join(settings.UPLOAD_FOLDER, f"{file_id}_{os.path.basename(file.filename)}"), filename.endswith(".pdf")
+
+def _find_upload(file_id: str) -> str | None:
+    """Locate a file uploaded before documents had database rows"""
+    matches = glob.glob(os.path.join(glob.escape(settings.UPLOAD_FOLDER), f"{glob.escape(file_id)}_*"))
+    return matches[0] if matches else None
+
+def _ingest_error(error: Exception) -> HTTPException:
+    if isinstance(error, HTTPException):
+        return error
+    if isinstance(error, UnicodeDecodeError):
+        return HTTPException(status_code=400, detail="TXT files must be UTF-8 encoded")
+    if isinstance(error, EmbeddingSpaceMismatch):
+        logger.error("❌ %s", error)
+        return HTTPException(status_code=409, detail=str(error))
+    if isinstance(error, EmbedderUnavailable):
+        logger.error("❌ %s", error)
+        return HTTPException(status_code=503, detail=str(error))
+    logger.error("Error processing file: %s", error)
+    return HTTPException(status_code=500, detail=f"Error processing file: {str(error)}")
+
+def _save_upload(source, save_path: str) -> tuple:
+    """Copy an upload to disk in UPLOAD_CHUNK_BYTES pieces, enforcing MAX_UPLOAD_BYTES and
+    hashing as it goes. Returns (size in bytes, sha256 hex digest)."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(save_path, "wb") as f:
+        while block := source.read(settings.UPLOAD_CHUNK_BYTES):
+            size += len(block)
+            if size > settings.MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"File exceeds the {settings.MAX_UPLOAD_BYTES} byte upload limit")
+            digest.update(block)
+            f.write(block)
+    return size, digest.hexdigest()
+
+def _remove_file(path: str):
+    if os.path.exists(path):
+        os.remove(path)
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Request
 from pydantic import BaseModel
-from core.llm_engine import call_gemini, web_search
+from starlette.concurrency import run_in_threadpool
+from core.llm_engine import call_gemini_detailed, web_search, format_web_results
+from core.admission import admission, tenant_key, AdmissionRejected
+from core.usage import usage_tracker
+from core.model_router import model_router, validate_model, SUPPORTED_MODELS, AUTO_MODEL
 from utils.logger import get_logger
 import os
 
@@ -16,12 +20,23 @@ class LLMRequest(BaseModel):
     model: str = "gemini-2.5-flash"
     use_websearch: bool = False
     serp_api_key: str | None = None
+    session_id: str | None = None
 
 @router.post("/")
-def chat_with_llm(req: LLMRequest):
+async def chat_with_llm(req: LLMRequest, http_request: Request):
+    """Admit the request, then run the blocking LLM call in the threadpool"""
+    async with admission.admit(tenant_key(http_request, req.session_id)):
+        return await run_in_threadpool(_chat_with_llm, req)
+
+def _chat_with_llm(req: LLMRequest):
     try:
-        logger.info(f"Received LLM request for model: {req.model}")
-        logger.info(f"Web search enabled: {req.use_websearch}")
+        logger.info("Received LLM request for model: %s", req.model)
+        logger.info("Web search enabled: %s", req.use_websearch)
+        
+        try:
+            validate_model(req.model)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         effective_api_key = req.api_key or os.getenv("GEMINI_API_KEY")
         if not effective_api_key:
@@ -62,49 +77,65 @@ Please provide a helpful answer based on the context above. If the context doesn
                     if web_results:
                         web_search_used = True
                         web_context = "\n\nADDITIONAL INFORMATION FROM WEB SEARCH:\n"
-                        web_context += "\n".join([f"• {result.get('snippet', 'No snippet available')}" 
-                                                for result in web_results[:3]])  
+                        web_context += format_web_results(web_results)
                         
                         # Add the web context to the final prompt
                         final_prompt += web_context
                         
-                        logger.info(f"✅ Web search successful, found {len(web_results)} results")
+                        logger.info("✅ Web search successful, found %s results", len(web_results))
                     else:
                         web_context = "\n\nNote: Web search was performed but no relevant results were found."
                         final_prompt += web_context
                         
                 except Exception as web_error:
-                    logger.error(f"Web search failed: {str(web_error)}")
+                    logger.error("Web search failed: %s", web_error)
                     web_context = f"\n\nNote: Web search encountered an error: {str(web_error)}"
                     final_prompt += web_context
         
-        logger.info(f"Final prompt length: {len(final_prompt)} characters")
-        logger.debug(f"Final prompt: {final_prompt[:500]}...")
+        logger.info("Final prompt length: %s characters", len(final_prompt))
+        logger.debug("Final prompt: %.500s", final_prompt)
         
-        response = call_gemini(
+        routing = model_router.route(req.model, final_prompt)
+        model = usage_tracker.admit(routing["model"], req.session_id, effective_api_key)
+        if model != routing["model"]:
+            routing.update(model=model, reason="over_budget")
+        result = call_gemini_detailed(
             prompt=final_prompt,
-            model=req.model,
+            model=model,
             temperature=req.temperature,
             api_key=effective_api_key  
         )
+        if result["usage"] is not None:
+            usage_tracker.record(result["usage"], req.session_id, effective_api_key)
         
         return {
             "status": "success",
-            "reply": response,
-            "model_used": req.model,
+            "reply": result["text"],
+            "model_used": result["model"],
             "web_search_used": web_search_used,
-            "prompt_length": len(final_prompt)
+            "prompt_length": len(final_prompt),
+            "usage": result["usage"],
+            "routing": routing
         }
         
+    except (HTTPException, AdmissionRejected):
+        raise
     except Exception as e:
-        logger.error(f"LLM API error: {str(e)}")
+        logger.error("LLM API error: %s", e)
         raise HTTPException(status_code=500, detail=f"LLM processing failed: {str(e)}")
 
+@router.get("/usage")
+def get_usage(session_id: str | None = None, x_gemini_api_key: str | None = Header(None)):
+    """Token and cost totals per model, plus one session's and one API key's totals when given.
+    The key is read from the X-Gemini-Api-Key header so it never appears in URLs or access logs."""
+    return usage_tracker.stats(session_id, x_gemini_api_key)
+
 @router.get("/health")
 def health_check():
     """Health check endpoint for LLM service"""
     return {
         "status": "healthy",
         "service": "LLM API",
-        "available_models": ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-2.0-flash"]
+        "available_models": [AUTO_MODEL, *SUPPORTED_MODELS],
+        "model_health": model_router.health()
     }
\ No newline at end of file
@@ -1,6 +1,19 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from core.workflow_runner import execute_workflow
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, List
+import json
+import time
+from core.workflow_runner import build_executor, executor_cache
+from core.batch_runner import parse_batch_items, run_batch
+from core.run_context import RunContext, RunCancelled, DeadlineExceeded, run_status, run_until_disconnect
+from core.admission import admission, tenant_key, AdmissionRejected, PRIORITIES
+from db import workflow_store
+from db.chat_log_writer import chat_log_writer, node_timings
+from db.database import AsyncSessionLocal, get_async_db
+from utils.config import settings
 from utils.logger import get_logger
 
 router = APIRouter()
@@ -13,19 +26,33 @@ class RunRequest(BaseModel):
 class BuildRequest(BaseModel):
     workflow: dict
 
+class SaveWorkflowRequest(BaseModel):
+    name: str
+    workflow: dict
+    description: str | None = None
+
+class UpdateWorkflowRequest(BaseModel):
+    workflow: dict | None = None
+    name: str | None = None
+    description: str | None = None
+
+class BatchRunRequest(BaseModel):
+    workflow: dict
+    queries: List[Any]
+    concurrency: int | None = None
+    use_cache: bool = True
+    session_id: str | None = None
+
 @router.post("/build")
 def build_workflow(req: BuildRequest):
     """
     Validate and build workflow without executing
     """
     try:
-        from core.workflow_runner import WorkflowExecutor
-        
-        executor = WorkflowExecutor()
         nodes = req.workflow.get("nodes", [])
         edges = req.workflow.get("edges", [])
         
-        executor.build_workflow(nodes, edges)
+        build_executor(req.workflow)
         
         return {
             "status": "success", 
@@ -35,46 +62,303 @@ def build_workflow(req: BuildRequest):
         }
         
     except Exception as e:
-        logger.error(f"Workflow build failed: {str(e)}")
+        logger.error("Workflow build failed: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/run")
-async def run_workflow(request: dict):
+async def run_workflow(request: dict, http_request: Request):
     """
-    Run workflow and return both final output and node results
+    Run workflow and return both final output and node results.
+    The run is bounded by timeout_seconds (capped at WORKFLOW_RUN_TIMEOUT_SECONDS) and is
+    cancelled if the client disconnects.
     """
+    workflow_data = request.get("workflow", {})
+    if not workflow_data:
+        raise HTTPException(status_code=400, detail="Workflow data is required")
+    if not isinstance(workflow_data, dict):
+        raise HTTPException(status_code=400, detail="Workflow must be a JSON object")
+    
+    # Build before admission so an invalid graph (unsupported model, bad latencySloMs,
+    # timeoutSeconds, topK, ...) is a 400 rather than a failed run
+    try:
+        executor = build_executor(workflow_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return await _execute_run(http_request, request, executor.execute_workflow)
+
+async def _execute_run(http_request: Request, request: dict, func, *args, workflow_id: int | None = None) -> dict:
+    """Admit, run func(*args, query, session_id, ...) until done or disconnected, and record the run"""
     try:
-        workflow_data = request.get("workflow", {})
         query = request.get("query", "")
         session_id = request.get("session_id", "default")  
+        use_cache = request.get("use_cache", True)
+        timeout_seconds = _run_timeout(request.get("timeout_seconds"))
+        priority = request.get("priority", "interactive")
         
-        if not workflow_data:
-            raise HTTPException(status_code=400, detail="Workflow data is required")
         if not query:
             raise HTTPException(status_code=400, detail="Query is required")
+        if priority not in PRIORITIES:
+            raise HTTPException(status_code=400, detail=f"priority must be one of {list(PRIORITIES)}")
+        # Only a real boolean; a string like "false" would otherwise count as true
+        if not isinstance(use_cache, bool):
+            raise HTTPException(status_code=400, detail="use_cache must be true or false")
+        
+        logger.info("🚀 Running workflow for session %s", session_id)
+        logger.debug("Workflow query: %.200s", query)
         
-        logger.info(f"🚀 Running workflow with query: {query}, session: {session_id}")
+        async with admission.admit(tenant_key(http_request, session_id), priority):
+            run_context = RunContext(timeout_seconds)
+            started_at = time.perf_counter()
+            try:
+                result = await run_until_disconnect(
+                    http_request, run_context, func,
+                    *args, query, session_id, use_cache=use_cache, run_context=run_context
+                )
+            except Exception as e:
+                elapsed_ms = (time.perf_counter() - started_at) * 1000
+                chat_log_writer.record(query, str(e), elapsed_ms, status=run_status(e), session_id=session_id, workflow_id=workflow_id)
+                raise
         
-        result = execute_workflow(workflow_data, query, session_id)
+        chat_log_writer.record(
+            query, result["final_output"], result["timings"]["total_ms"],
+            session_id=session_id, workflow_id=workflow_id, node_timings=node_timings(result["node_results"])
+        )
         
         return {
             "success": True,
             "final_output": result["final_output"],
             "node_results": result["node_results"],
+            "timings": result["timings"],
+            "usage": result["usage"],
             "session_id": session_id
         }
         
+    except (HTTPException, AdmissionRejected):
+        raise
+    except DeadlineExceeded as e:
+        logger.warning("Workflow execution timed out: %s", e)
+        raise HTTPException(status_code=504, detail=str(e))
+    except RunCancelled as e:
+        logger.info("Workflow execution cancelled: %s", e)
+        raise HTTPException(status_code=499, detail=str(e))
     except Exception as e:
-        logger.error(f"Workflow execution failed: {str(e)}")
+        logger.error("Workflow execution failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+
+def _run_timeout(requested) -> float:
+    """Client-requested run timeout, never above the server-wide limit"""
+    if requested is None:
+        return settings.WORKFLOW_RUN_TIMEOUT_SECONDS
+    try:
+        requested = float(requested)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="timeout_seconds must be a number")
+    if requested <= 0:
+        raise HTTPException(status_code=400, detail="timeout_seconds must be positive")
+    return min(requested, settings.WORKFLOW_RUN_TIMEOUT_SECONDS)
+    
+def _stream_batch(workflow: dict, items: list, concurrency: int | None, tenant: str, use_cache: bool = True, session_id: str | None = None, workflow_id: int | None = None) -> StreamingResponse:
+    """Validate the workflow up front, then stream batch results as NDJSON.
+
+    Each result is recorded in the chat log like a /run; session_id only labels those rows,
+    since batch runs do not use conversation memory.
+    """
+    try:
+        build_executor(workflow)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
+    async def ndjson():
+        async for outcome in run_batch(workflow, items, concurrency, use_cache, tenant):
+            if "done" not in outcome:
+                chat_log_writer.record(
+                    outcome["query"], outcome.get("final_output", outcome.get("error")), outcome["latency_ms"],
+                    status=outcome["status"], session_id=session_id, workflow_id=workflow_id,
+                    node_timings=node_timings(outcome.get("node_results", {}))
+                )
+            yield json.dumps(outcome) + "\n"
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.post("/run/batch")
+async def run_workflow_batch(req: BatchRunRequest, http_request: Request):
+    """
+    Run a workflow over many queries and stream one NDJSON line per query
+    """
+    try:
+        items = parse_batch_items(req.queries)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return _stream_batch(req.workflow, items, req.concurrency, tenant_key(http_request), req.use_cache, req.session_id)
+
+@router.post("/run/batch/upload")
+async def run_workflow_batch_upload(
+    http_request: Request,
+    workflow: str = Form(...),
+    file: UploadFile = File(...),
+    concurrency: int | None = Form(None),
+    use_cache: bool = Form(True),
+    session_id: str | None = Form(None)
+):
+    """
+    Run a workflow over a JSONL file of queries (one string or {"id", "query"} object per line)
+    """
+    try:
+        workflow_data = json.loads(workflow)
+        entries = []
+        for line_number, line in enumerate((await file.read()).decode("utf-8").splitlines(), start=1):
+            if line.strip():
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    raise ValueError(f"Invalid JSON on line {line_number}")
+        items = parse_batch_items(entries)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not isinstance(workflow_data, dict):
+        raise HTTPException(status_code=400, detail="Workflow must be a JSON object")
+    
+    return _stream_batch(workflow_data, items, concurrency, tenant_key(http_request), use_cache, session_id)
+
 @router.get("/validate/{workflow_id}")
-def validate_workflow(workflow_id: str):
+async def validate_workflow(workflow_id: int, version: int | None = None):
     """
-    Validate a saved workflow
+    Validate a saved workflow (the latest version unless one is given)
     """
+    try:
+        resolved_version, executor = await _load_executor(workflow_id, version)
+    except ValueError as e:
+        return {
+            "workflow_id": workflow_id,
+            "version": version,
+            "valid": False,
+            "message": str(e)
+        }
+    
     return {
         "workflow_id": workflow_id,
+        "version": resolved_version,
         "valid": True,
-        "message": "Workflow validation endpoint"
-    }
\ No newline at end of file
+        "message": "Workflow is valid",
+        "node_count": len(executor.nodes),
+        "edge_count": len(executor.connections)
+    }
+
+async def _load_executor(workflow_id: int, version: int | None = None) -> tuple:
+    """Return (version, built executor) for a saved workflow, reading through executor_cache.
+
+    Uses its own short-lived session so a long run never holds a pooled connection.
+    Raises ValueError if the stored graph does not build.
+    """
+    cached = executor_cache.get((workflow_id, version))
+    if cached is not None:
+        return cached
+    
+    async with AsyncSessionLocal() as db:
+        if version is None:
+            saved = await workflow_store.get_workflow(db, workflow_id)
+        else:
+            saved = await workflow_store.get_workflow_version(db, workflow_id, version)
+    if saved is None:
+        raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} version {version if version is not None else 'latest'} not found")
+    
+    loaded = (saved.version, build_executor(saved.structure))
+    executor_cache.set((workflow_id, version), loaded)
+    executor_cache.set((workflow_id, saved.version), loaded)
+    return loaded
+
+@router.post("")
+async def save_workflow(req: SaveWorkflowRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Save a new workflow as version 1
+    """
+    try:
+        build_executor(req.workflow)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    saved = await workflow_store.create_workflow(db, req.name, req.workflow, req.description)
+    return saved.to_dict()
+
+@router.get("")
+async def list_saved_workflows(limit: int = 100, offset: int = 0, db: AsyncSession = Depends(get_async_db)):
+    """
+    List saved workflows
+    """
+    workflows = await workflow_store.list_workflows(db, limit, offset)
+    return {"workflows": [saved.to_dict() for saved in workflows]}
+
+@router.get("/{workflow_id}")
+async def get_saved_workflow(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get the latest version of a saved workflow
+    """
+    saved = await workflow_store.get_workflow(db, workflow_id)
+    if saved is None:
+        raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+    return saved.to_dict()
+
+@router.put("/{workflow_id}")
+async def update_saved_workflow(workflow_id: int, req: UpdateWorkflowRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Rename a saved workflow or store a new version of its graph
+    """
+    if req.workflow is not None:
+        try:
+            build_executor(req.workflow)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        saved = await workflow_store.update_workflow(db, workflow_id, req.workflow, req.name, req.description)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail=f"Workflow {workflow_id} is being updated concurrently, try again")
+    if saved is None:
+        raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+    
+    # Pinned versions never change, only what "latest" points at
+    executor_cache.invalidate((workflow_id, None))
+    return saved.to_dict()
+
+@router.get("/{workflow_id}/versions")
+async def list_saved_workflow_versions(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    List every stored version of a saved workflow
+    """
+    versions = await workflow_store.list_workflow_versions(db, workflow_id)
+    if not versions:
+        raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+    return {"workflow_id": workflow_id, "versions": [saved.to_dict() for saved in versions]}
+
+@router.get("/{workflow_id}/versions/{version}")
+async def get_saved_workflow_version(workflow_id: int, version: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get one stored version of a saved workflow
+    """
+    saved = await workflow_store.get_workflow_version(db, workflow_id, version)
+    if saved is None:
+        raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} version {version} not found")
+    return saved.to_dict()
+
+@router.post("/{workflow_id}/run")
+async def run_saved_workflow(workflow_id: int, request: dict, http_request: Request):
+    """
+    Run a saved workflow by id, pinned to request["version"] or the latest version.
+    Accepts the same options as /run apart from the workflow itself.
+    """
+    version = request.get("version")
+    if version is not None and not isinstance(version, int):
+        raise HTTPException(status_code=400, detail="version must be an integer")
+    
+    try:
+        resolved_version, executor = await _load_executor(workflow_id, version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    response = await _execute_run(http_request, request, executor.execute_workflow, workflow_id=workflow_id)
+    response["workflow_id"] = workflow_id
+    response["version"] = resolved_version
+    return response
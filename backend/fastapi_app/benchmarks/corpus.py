@@ -0,0 +1,56 @@
+"""Deterministic synthetic documents and queries for benchmarks"""
+import os
+import random
+from typing import List
+
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "ze", "qua", "bri", "dor", "fen", "gal", "hix", "jor"]
+
+def vocabulary(size: int = 2000, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+def generate_text(num_chars: int, seed: int = 0, vocab: List[str] | None = None) -> str:
+    """Paragraphs of pseudo-words, roughly num_chars long, identical for the same seed"""
+    rng = random.Random(seed)
+    vocab = vocab or vocabulary()
+    parts = []
+    length = 0
+    while length < num_chars:
+        sentence = " ".join(rng.choice(vocab) for _ in range(rng.randint(6, 18))).capitalize() + "."
+        if rng.random() < 0.15:
+            sentence += "\n\n"
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(parts)[:num_chars]
+
+def generate_queries(count: int, seed: int = 1, vocab: List[str] | None = None) -> List[str]:
+    rng = random.Random(seed)
+    vocab = vocab or vocabulary()
+    return [f"What does {' '.join(rng.choice(vocab) for _ in range(rng.randint(2, 5)))} mean?" for _ in range(count)]
+
+def write_txt_corpus(directory: str, num_docs: int, doc_chars: int, seed: int = 0) -> List[str]:
+    os.makedirs(directory, exist_ok=True)
+    vocab = vocabulary()
+    paths = []
+    for i in range(num_docs):
+        path = os.path.join(directory, f"doc_{i:04d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(generate_text(doc_chars, seed=seed + i, vocab=vocab))
+        paths.append(path)
+    return paths
+
+def write_pdf(path: str, num_pages: int, chars_per_page: int = 3000, seed: int = 0) -> str:
+    """Write a synthetic multi-page PDF with PyMuPDF"""
+    import fitz
+    
+    vocab = vocabulary()
+    with fitz.open() as doc:
+        for page_number in range(num_pages):
+            page = doc.new_page()
+            text = generate_text(chars_per_page, seed=seed + page_number, vocab=vocab)
+            page.insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=7)
+        doc.save(path)
+    return path
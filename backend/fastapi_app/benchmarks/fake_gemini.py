@@ -0,0 +1,125 @@
+"""Local stand-in for the Gemini REST API and SerpAPI with configurable latency.
+
+Responses are deterministic for a given prompt. Point the app at it with
+GEMINI_API_ENDPOINT=http://127.0.0.1:<port> and SERPAPI_URL=http://127.0.0.1:<port>/search.json.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+class FakeConfig:
+    def __init__(self, latency_ms: float = 200.0, per_token_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.per_token_ms = per_token_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+    
+    def delay_seconds(self, completion_tokens: int) -> float:
+        with self.lock:
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + completion_tokens * self.per_token_ms + jitter) / 1000
+    
+    def should_fail(self) -> bool:
+        with self.lock:
+            self.requests += 1
+            return self.error_rate > 0 and self.rng.random() < self.error_rate
+
+def _prompt_text(body: dict) -> str:
+    parts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            parts.append(part.get("text", ""))
+    return "\n".join(parts)
+
+def make_handler(config: FakeConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            path = urlparse(self.path).path
+            if ":generateContent" not in path:
+                self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {path}"}})
+                return
+            
+            model = path.split("/models/")[-1].split(":")[0]
+            prompt = _prompt_text(body)
+            digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+            text = f"[{model}] Deterministic answer {digest[:16]} for a prompt of {len(prompt)} characters."
+            prompt_tokens = max(1, len(prompt) // 4)
+            completion_tokens = max(1, len(text) // 4)
+            
+            time.sleep(config.delay_seconds(completion_tokens))
+            if config.should_fail():
+                self._send_json(503, {"error": {"code": 503, "message": "Injected failure", "status": "UNAVAILABLE"}})
+                return
+            
+            self._send_json(200, {
+                "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+                "usageMetadata": {
+                    "promptTokenCount": prompt_tokens,
+                    "candidatesTokenCount": completion_tokens,
+                    "totalTokenCount": prompt_tokens + completion_tokens,
+                },
+            })
+        
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            if parsed.path != "/search.json":
+                self._send_json(404, {"error": "not found"})
+                return
+            query = parse_qs(parsed.query).get("q", [""])[0]
+            num = int(parse_qs(parsed.query).get("num", ["3"])[0])
+            time.sleep(config.delay_seconds(0))
+            self._send_json(200, {"organic_results": [
+                {"title": f"Result {i} for {query}", "snippet": f"Synthetic snippet {i} about {query}.", "link": f"https://example.com/{i}"}
+                for i in range(num)
+            ]})
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return Handler
+
+def start_server(config: FakeConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the fake server on a background thread and return it; server.server_port has the bound port"""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini / SerpAPI server for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--per-token-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    config = FakeConfig(args.latency_ms, args.per_token_ms, args.jitter_ms, args.error_rate, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Fake Gemini listening on http://{args.host}:{server.server_port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
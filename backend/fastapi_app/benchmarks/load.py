@@ -0,0 +1,96 @@
+"""End-to-end load scenarios against a running backend"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from benchmarks.corpus import generate_text, generate_queries
+from benchmarks.stats import summarize
+
+BENCH_WORKFLOW = {
+    "nodes": [
+        {"id": "query", "type": "userQuery"},
+        {"id": "kb", "type": "knowledgeBase"},
+        {"id": "llm", "type": "llm", "data": {"config": {"model": "gemini-2.5-flash", "apiKey": "bench-key", "temperature": 0.2}}},
+        {"id": "out", "type": "output"},
+    ],
+    "edges": [
+        {"source": "query", "target": "kb"},
+        {"source": "kb", "target": "llm"},
+        {"source": "llm", "target": "out"},
+    ],
+}
+
+def _run_scenario(name: str, total: int, concurrency: int, send) -> dict:
+    """Issue total requests through send(session, i) from concurrency threads and report latency and throughput"""
+    local = threading.local()
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+    
+    def one(i: int):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started_at = time.perf_counter()
+        try:
+            response = send(session, i)
+            ok = response.status_code < 400
+            error = None if ok else str(response.status_code)
+        except requests.RequestException as e:
+            ok, error = False, type(e).__name__
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        with lock:
+            if ok:
+                latencies.append(elapsed_ms)
+            else:
+                errors[error] = errors.get(error, 0) + 1
+    
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    duration = time.perf_counter() - started_at
+    
+    return {
+        "scenario": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "succeeded": len(latencies),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 3) if duration else 0.0,
+        "latency_ms": summarize(latencies),
+    }
+
+def workflow_run(base_url: str, total: int = 200, concurrency: int = 8, use_cache: bool = False) -> dict:
+    queries = generate_queries(total)
+    
+    def send(session, i):
+        return session.post(f"{base_url}/api/workflows/run", json={
+            "workflow": BENCH_WORKFLOW,
+            "query": queries[i],
+            "session_id": None,
+            "use_cache": use_cache,
+        }, headers={"X-Tenant-Id": f"bench-{i % concurrency}"}, timeout=300)
+    
+    return _run_scenario("workflow_run", total, concurrency, send)
+
+def document_upload(base_url: str, total: int = 20, concurrency: int = 4, doc_chars: int = 200_000) -> dict:
+    documents = [generate_text(doc_chars, seed=i).encode("utf-8") for i in range(min(total, 8))]
+    
+    def send(session, i):
+        files = {"file": (f"bench-{uuid.uuid4().hex[:8]}.txt", documents[i % len(documents)], "text/plain")}
+        return session.post(f"{base_url}/api/documents/upload", files=files, timeout=600)
+    
+    return _run_scenario("document_upload", total, concurrency, send)
+
+def run_all(base_url: str, quick: bool = False) -> dict:
+    if quick:
+        return {
+            "document_upload": document_upload(base_url, total=4, concurrency=2, doc_chars=50_000),
+            "workflow_run": workflow_run(base_url, total=40, concurrency=4),
+        }
+    return {
+        "document_upload": document_upload(base_url),
+        "workflow_run": workflow_run(base_url),
+    }
@@ -0,0 +1,104 @@
+"""Micro-benchmarks for the ingestion and retrieval hot paths.
+
+Imports core modules lazily so the caller can point CHROMADB_PATH and friends at a
+scratch directory first (see benchmarks.run).
+"""
+import itertools
+import os
+import tempfile
+from benchmarks.corpus import generate_text, generate_queries, write_pdf, write_txt_corpus
+from benchmarks.stats import time_calls
+
+def bench_chunk_text(sizes=(10_000, 100_000, 1_000_000), repeat: int = 5) -> dict:
+    from core.text_extractor import chunk_text
+    
+    results = {}
+    for size in sizes:
+        text = generate_text(size, seed=size)
+        results[f"{size}_chars"] = time_calls(lambda: chunk_text(text, chunk_size=800, overlap=80), repeat)
+    return results
+
+def bench_extract_text_from_pdf(page_counts=(1, 10, 50), repeat: int = 3) -> dict:
+    try:
+        import fitz  # noqa: F401
+    except ImportError:
+        return {"skipped": "PyMuPDF is not installed"}
+    from core.text_extractor import extract_text_from_pdf
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in page_counts:
+            path = write_pdf(os.path.join(directory, f"bench_{pages}.pdf"), pages, seed=pages)
+            results[f"{pages}_pages"] = time_calls(lambda: extract_text_from_pdf(path), repeat)
+    return results
+
+def bench_embed_texts(batch_sizes=(1, 16, 64), repeat: int = 5) -> dict:
+    from core.embeddings import embed_texts, get_model_info
+    
+    results = {"model": get_model_info()}
+    for batch_size in batch_sizes:
+        texts = [generate_text(800, seed=i) for i in range(batch_size)]
+        results[f"batch_{batch_size}"] = time_calls(lambda: embed_texts(texts), repeat)
+    return results
+
+def bench_ingest_document(num_docs: int = 5, doc_chars: int = 200_000, pdf_pages: int = 20, repeat: int = 3) -> dict:
+    """Full ingest (chunk, embed, index) of TXT and PDF files, each call under a fresh file_id"""
+    from core.document_ingest import ingest_document
+    from core.vectorstore import reset_collection
+    
+    reset_collection()
+    results = {}
+    counter = itertools.count()
+    with tempfile.TemporaryDirectory() as directory:
+        txt_paths = write_txt_corpus(os.path.join(directory, "txt"), num_docs, doc_chars)
+        
+        def ingest_txt():
+            i = next(counter)
+            ingest_document(txt_paths[i % num_docs], False, f"bench-txt-{i}", "bench.txt")
+        
+        results[f"txt_{doc_chars}_chars"] = time_calls(ingest_txt, repeat)
+        try:
+            import fitz  # noqa: F401
+        except ImportError:
+            results[f"pdf_{pdf_pages}_pages"] = {"skipped": "PyMuPDF is not installed"}
+        else:
+            pdf_path = write_pdf(os.path.join(directory, "bench.pdf"), pdf_pages)
+            results[f"pdf_{pdf_pages}_pages"] = time_calls(
+                lambda: ingest_document(pdf_path, True, f"bench-pdf-{next(counter)}", "bench.pdf"), repeat
+            )
+    reset_collection()
+    return results
+
+def bench_query_similar(index_chunks: int = 2000, num_queries: int = 50, n_results: int = 3) -> dict:
+    from core.embeddings import embed_texts
+    from core.vectorstore import add_document_chunks, query_similar, reset_collection
+    
+    reset_collection()
+    batch = 256
+    for start in range(0, index_chunks, batch):
+        chunks = [generate_text(800, seed=start + i) for i in range(min(batch, index_chunks - start))]
+        metas = [{"source": "bench", "chunk_index": start + i, "file_id": "bench"} for i in range(len(chunks))]
+        add_document_chunks(doc_id=f"bench-{start}", chunks=chunks, embeddings=embed_texts(chunks), metas=metas)
+    
+    queries = iter(generate_queries(num_queries + 1) * 2)
+    return {
+        "index_chunks": index_chunks,
+        "latency_ms": time_calls(lambda: query_similar(next(queries), n_results=n_results), num_queries),
+    }
+
+def run_all(quick: bool = False) -> dict:
+    if quick:
+        return {
+            "chunk_text": bench_chunk_text(sizes=(10_000, 100_000), repeat=3),
+            "extract_text_from_pdf": bench_extract_text_from_pdf(page_counts=(1, 5), repeat=2),
+            "embed_texts": bench_embed_texts(batch_sizes=(1, 16), repeat=2),
+            "ingest_document": bench_ingest_document(num_docs=2, doc_chars=20_000, pdf_pages=3, repeat=2),
+            "query_similar": bench_query_similar(index_chunks=200, num_queries=10),
+        }
+    return {
+        "chunk_text": bench_chunk_text(),
+        "extract_text_from_pdf": bench_extract_text_from_pdf(),
+        "embed_texts": bench_embed_texts(),
+        "ingest_document": bench_ingest_document(),
+        "query_similar": bench_query_similar(),
+    }
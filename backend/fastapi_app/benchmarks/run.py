@@ -0,0 +1,128 @@
+"""Benchmark entry point.
+
+    python -m benchmarks.run micro [--quick]
+    python -m benchmarks.run load --base-url http://127.0.0.1:8000
+    python -m benchmarks.run load --spawn [--latency-ms 200]
+
+Micro runs and spawned apps embed with the model-free hashing backend by default, so no
+model is downloaded; pass --embedding-backend sentence-transformers to measure the real model.
+
+--spawn starts the fake Gemini/SerpAPI server and a uvicorn instance of the app with a
+scratch database, upload folder and Chroma index, so load runs need no network or keys.
+Results are printed (and optionally written with --out) as JSON.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _scratch_env(directory: str, embedding_backend: str) -> dict:
+    return {
+        "EMBEDDING_BACKEND": embedding_backend,
+        "CHROMADB_PATH": os.path.join(directory, "chroma_db"),
+        "UPLOAD_FOLDER": os.path.join(directory, "uploads"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(directory, 'bench.db')}",
+    }
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_for(url: str, timeout: float = 120.0):
+    import requests
+    
+    give_up_at = time.monotonic() + timeout
+    while time.monotonic() < give_up_at:
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+def run_micro(args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update(_scratch_env(directory, args.embedding_backend))
+        sys.path.insert(0, APP_DIR)
+        from benchmarks import micro
+        return micro.run_all(quick=args.quick)
+
+def run_load(args) -> dict:
+    from benchmarks import load
+    
+    if not args.spawn:
+        return load.run_all(args.base_url, quick=args.quick)
+    
+    from benchmarks.fake_gemini import FakeConfig, start_server
+    
+    fake = start_server(FakeConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=0))
+    fake_url = f"http://127.0.0.1:{fake.server_port}"
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, **_scratch_env(directory, args.embedding_backend))
+        env.update({
+            "GEMINI_API_ENDPOINT": fake_url,
+            "GEMINI_API_KEY": "bench-key",
+            "SERPAPI_URL": f"{fake_url}/search.json",
+        })
+        app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=APP_DIR, env=env
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            _wait_for(f"{base_url}/health")
+            results = load.run_all(base_url, quick=args.quick)
+            results["fake_llm_latency_ms"] = args.latency_ms
+            return results
+        finally:
+            app.terminate()
+            app.wait(timeout=30)
+            fake.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the FastAPI backend")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    micro_parser = subparsers.add_parser("micro", help="Micro-benchmarks of chunking, PDF extraction, embedding, TXT/PDF ingest and retrieval")
+    micro_parser.add_argument("--quick", action="store_true", help="Smaller inputs for a fast smoke run")
+    
+    load_parser = subparsers.add_parser("load", help="End-to-end load scenarios over HTTP")
+    load_parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    load_parser.add_argument("--spawn", action="store_true", help="Start a fake LLM and a scratch app instance")
+    load_parser.add_argument("--latency-ms", type=float, default=200.0, help="Fake LLM latency when spawning")
+    load_parser.add_argument("--jitter-ms", type=float, default=0.0, help="Fake LLM latency jitter when spawning")
+    load_parser.add_argument("--quick", action="store_true")
+    
+    for sub in (micro_parser, load_parser):
+        sub.add_argument("--out", help="Also write the JSON report to this file")
+        sub.add_argument("--embedding-backend", choices=("hashing", "sentence-transformers"), default="hashing", help="Embedder for the scratch index")
+    
+    args = parser.parse_args()
+    started_at = time.time()
+    results = run_micro(args) if args.command == "micro" else run_load(args)
+    report = {
+        "benchmark": args.command,
+        "started_at": started_at,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import math
+import time
+from typing import Callable, List
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies_ms: List[float]) -> dict:
+    values = sorted(latencies_ms)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3),
+        "min": round(values[0], 3),
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(values[-1], 3),
+    }
+
+def time_calls(func: Callable, repeat: int, warmup: int = 1) -> dict:
+    """Call func repeat times after warmup calls and summarize the latencies in milliseconds"""
+    for _ in range(warmup):
+        func()
+    latencies = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    return summarize(latencies)
@@ -0,0 +1,205 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+from core.metrics import registry
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger("admission")
+
+PRIORITIES = ("interactive", "batch")
+
+ADMISSION_WAIT_SECONDS = registry.histogram("admission_wait_seconds", "Time spent queued before admission, by priority class")
+ADMISSION_REJECTED = registry.counter("admission_rejected_total", "Requests rejected by admission control, by reason")
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; retry_after is a hint in whole seconds"""
+
+    def __init__(self, reason: str, retry_after: int, status_code: int = 503):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+class AdmissionController:
+    """Bounded, priority-ordered admission for expensive work such as workflow runs and LLM calls.
+
+    At most max_concurrent requests run at once and at most per_tenant of them belong to one
+    tenant. Others wait in a queue ordered by priority class, then arrival. The queue holds at
+    most max_queue bounded entries; beyond that, or after waiting queue_timeout seconds, requests
+    are rejected with a Retry-After hint. All state lives on the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, per_tenant: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.per_tenant = per_tenant
+        self.queue_timeout = queue_timeout
+        
+        self.active = 0
+        self._active_by_tenant: Dict[str, int] = {}
+        self._waiters = {priority: deque() for priority in PRIORITIES}
+        self._bounded_waiting = 0
+        
+        self.admitted_total = 0
+        self.rejected_total: Dict[str, int] = {}
+        self._avg_service_seconds = 1.0
+        self._recent_waits = deque(maxlen=1000)
+    
+    @asynccontextmanager
+    async def admit(self, tenant: str, priority: str = "interactive", bounded: bool = True):
+        """Hold an execution slot for the duration of the block.
+
+        Unbounded entries (used for batch items, whose number is already capped by the batch
+        concurrency) wait without counting against max_queue and without a queue timeout.
+        """
+        if priority not in self._waiters:
+            raise ValueError(f"Unknown priority class: {priority}")
+        
+        enqueued_at = time.monotonic()
+        if self._can_start(tenant) and not self._has_waiters():
+            self._start(tenant)
+        else:
+            await self._wait_for_slot(tenant, priority, bounded)
+        
+        waited = time.monotonic() - enqueued_at
+        self._recent_waits.append(waited)
+        ADMISSION_WAIT_SECONDS.observe(waited, priority=priority)
+        started_at = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self._finish(tenant, time.monotonic() - started_at)
+    
+    async def _wait_for_slot(self, tenant: str, priority: str, bounded: bool):
+        if bounded and self._bounded_waiting >= self.max_queue:
+            self._reject("queue_full")
+            raise AdmissionRejected("Server is busy, run queue is full", self.retry_after())
+        
+        future = asyncio.get_running_loop().create_future()
+        waiter = (tenant, future, bounded)
+        self._waiters[priority].append(waiter)
+        if bounded:
+            self._bounded_waiting += 1
+        # Slots may be free for this tenant even though other tenants' waiters are stuck at their cap
+        self._dispatch()
+        
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout if bounded else None)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Admitted just as we gave up; hand the slot back
+                self._finish(tenant, 0.0)
+            else:
+                future.cancel()
+                self._remove_waiter(priority, waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject("queue_timeout")
+            raise AdmissionRejected("Server is busy, timed out waiting for a run slot", self.retry_after())
+    
+    def _remove_waiter(self, priority: str, waiter):
+        try:
+            self._waiters[priority].remove(waiter)
+            if waiter[2]:
+                self._bounded_waiting -= 1
+        except ValueError:
+            pass
+    
+    def _can_start(self, tenant: str) -> bool:
+        return self.active < self.max_concurrent and self._active_by_tenant.get(tenant, 0) < self.per_tenant
+    
+    def _has_waiters(self) -> bool:
+        return any(self._waiters[priority] for priority in PRIORITIES)
+    
+    def _start(self, tenant: str):
+        self.active += 1
+        self._active_by_tenant[tenant] = self._active_by_tenant.get(tenant, 0) + 1
+        self.admitted_total += 1
+    
+    def _finish(self, tenant: str, service_seconds: float):
+        self.active -= 1
+        remaining = self._active_by_tenant.get(tenant, 1) - 1
+        if remaining > 0:
+            self._active_by_tenant[tenant] = remaining
+        else:
+            self._active_by_tenant.pop(tenant, None)
+        if service_seconds > 0:
+            self._avg_service_seconds = 0.9 * self._avg_service_seconds + 0.1 * service_seconds
+        self._dispatch()
+    
+    def _dispatch(self):
+        """Hand free slots to the highest-priority waiters whose tenant is under its cap"""
+        for priority in PRIORITIES:
+            queue = self._waiters[priority]
+            for waiter in list(queue):
+                if self.active >= self.max_concurrent:
+                    return
+                tenant, future, bounded = waiter
+                if future.done():
+                    self._remove_waiter(priority, waiter)
+                    continue
+                if self._active_by_tenant.get(tenant, 0) < self.per_tenant:
+                    self._remove_waiter(priority, waiter)
+                    self._start(tenant)
+                    future.set_result(True)
+    
+    def _reject(self, reason: str):
+        self.rejected_total[reason] = self.rejected_total.get(reason, 0) + 1
+        ADMISSION_REJECTED.inc(reason=reason)
+        logger.warning("🚦 Admission rejected (%s), active=%s, queued=%s", reason, self.active, self.queue_depth())
+    
+    def queue_depth(self) -> int:
+        return sum(len(self._waiters[priority]) for priority in PRIORITIES)
+    
+    def retry_after(self) -> int:
+        """Rough seconds until a slot frees up, based on queue depth and average service time"""
+        waves = (self.queue_depth() + 1) / max(1, self.max_concurrent)
+        return max(1, math.ceil(waves * self._avg_service_seconds))
+    
+    def stats(self) -> dict:
+        waits = sorted(self._recent_waits)
+        
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 2)
+        
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": self.queue_depth(),
+            "queue_depth_by_priority": {priority: len(self._waiters[priority]) for priority in PRIORITIES},
+            "max_queue": self.max_queue,
+            "per_tenant_limit": self.per_tenant,
+            "admitted_total": self.admitted_total,
+            "rejected_total": dict(self.rejected_total),
+            "wait_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)},
+            "avg_service_ms": round(self._avg_service_seconds * 1000, 2),
+        }
+
+def tenant_key(request, session_id: str | None = None) -> str:
+    """Identify the caller for per-tenant caps: X-Tenant-Id header, then session id, then client address"""
+    tenant = request.headers.get("x-tenant-id")
+    if tenant:
+        return tenant
+    if session_id:
+        return f"session:{session_id}"
+    return f"client:{request.client.host if request.client else 'unknown'}"
+
+admission = AdmissionController(
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    per_tenant=settings.ADMISSION_TENANT_CONCURRENCY,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+
+registry.gauge("admission_active", "Requests currently holding an execution slot", lambda: {(): admission.active})
+registry.gauge(
+    "admission_queue_depth",
+    "Requests waiting for an execution slot, by priority class",
+    lambda: {(("priority", priority),): len(admission._waiters[priority]) for priority in PRIORITIES}
+)
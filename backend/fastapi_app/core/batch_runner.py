@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List
+from starlette.concurrency import run_in_threadpool
+from core.workflow_runner import build_executor
+from core.vectorstore import query_similar_batch
+from core.run_context import RunContext, run_status
+from core.admission import admission
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger("batch_runner")
+
+def parse_batch_items(queries: List[Any]) -> List[Dict[str, Any]]:
+    """Normalize batch input into {"id", "query"} items.
+
+    Each entry may be a plain query string or an object with a "query" key and optional "id".
+    """
+    items = []
+    for index, entry in enumerate(queries):
+        if isinstance(entry, str):
+            items.append({"id": index, "query": entry})
+        elif isinstance(entry, dict) and isinstance(entry.get("query"), str):
+            items.append({"id": entry.get("id", index), "query": entry["query"]})
+        else:
+            raise ValueError(f"Batch entry {index} must be a string or an object with a 'query' field")
+    
+    if not items:
+        raise ValueError("At least one query is required")
+    if len(items) > settings.BATCH_MAX_QUERIES:
+        raise ValueError(f"Batch exceeds the maximum of {settings.BATCH_MAX_QUERIES} queries")
+    return items
+
+async def run_batch(workflow: dict, items: List[Dict[str, Any]], concurrency: int | None = None, use_cache: bool = True, tenant: str = "batch") -> AsyncIterator[Dict[str, Any]]:
+    """Run a workflow over many queries, yielding one result per query as it completes.
+
+    The workflow is built once and shared by every run. When it contains a knowledgeBase
+    node, retrieval for each slice of BATCH_EMBED_SIZE queries is done with a single batched
+    embedding call. Batch runs do not read or write conversation memory. Each query gets its
+    own WORKFLOW_RUN_TIMEOUT_SECONDS deadline, and closing the stream cancels in-flight runs.
+    Items are admitted one by one at batch priority, so interactive runs go first under load.
+    """
+    executor = build_executor(workflow)
+    retrieval_size = executor.retrieval_size()
+    concurrency = max(1, min(concurrency or settings.BATCH_MAX_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY))
+    
+    logger.info("📦 Starting batch run of %s queries with concurrency %s", len(items), concurrency)
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    results: asyncio.Queue = asyncio.Queue()
+    tasks = set()
+    run_contexts = set()
+    started_at = time.perf_counter()
+    
+    async def run_one(item: Dict[str, Any], prefetched_docs: List[Dict] | None):
+        item_started_at = time.perf_counter()
+        run_context = None
+        try:
+            async with admission.admit(tenant, "batch", bounded=False):
+                run_context = RunContext(settings.WORKFLOW_RUN_TIMEOUT_SECONDS)
+                run_contexts.add(run_context)
+                result = await run_in_threadpool(executor.execute_workflow, item["query"], None, prefetched_docs, use_cache, run_context)
+            outcome = {
+                "id": item["id"],
+                "query": item["query"],
+                "success": True,
+                "status": "success",
+                "final_output": result["final_output"],
+                "node_results": result["node_results"],
+                "usage": result["usage"],
+            }
+        except Exception as e:
+            logger.error("❌ Batch item %s failed: %s", item['id'], e)
+            outcome = {"id": item["id"], "query": item["query"], "success": False, "status": run_status(e), "error": str(e)}
+        finally:
+            run_contexts.discard(run_context)
+            semaphore.release()
+        outcome["latency_ms"] = round((time.perf_counter() - item_started_at) * 1000, 2)
+        await results.put(outcome)
+    
+    async def produce():
+        embed_size = max(1, settings.BATCH_EMBED_SIZE)
+        for start in range(0, len(items), embed_size):
+            batch = items[start:start + embed_size]
+            if retrieval_size:
+                docs = await run_in_threadpool(query_similar_batch, [item["query"] for item in batch], retrieval_size, True)
+            else:
+                docs = [None] * len(batch)
+            for item, prefetched_docs in zip(batch, docs):
+                await semaphore.acquire()
+                task = asyncio.create_task(run_one(item, prefetched_docs))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+    
+    producer = asyncio.create_task(produce())
+    succeeded = 0
+    try:
+        for _ in range(len(items)):
+            get_result = asyncio.create_task(results.get())
+            done, _pending = await asyncio.wait({get_result, producer}, return_when=asyncio.FIRST_COMPLETED)
+            if get_result not in done:
+                # The producer finished first; surface its error if it failed, otherwise keep waiting
+                if producer.exception() is not None:
+                    get_result.cancel()
+                    raise producer.exception()
+                await get_result
+            outcome = get_result.result()
+            succeeded += outcome["success"]
+            yield outcome
+    finally:
+        producer.cancel()
+        for run_context in list(run_contexts):
+            run_context.cancel()
+        for task in list(tasks):
+            task.cancel()
+    
+    elapsed = time.perf_counter() - started_at
+    logger.info("🎉 Batch run finished: %s/%s succeeded in %.2fs", succeeded, len(items), elapsed)
+    yield {
+        "done": True,
+        "total": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "elapsed_ms": round(elapsed * 1000, 2),
+    }
@@ -0,0 +1,90 @@
+import numpy as np
+from typing import Dict, List
+
+# Chunks overlap by CHUNK_OVERLAP characters, less any whitespace strip() removed at the edges
+MAX_STITCH_OVERLAP = 200
+MIN_STITCH_OVERLAP = 8
+
+def select_mmr(docs: List[Dict], k: int, mmr_lambda: float) -> List[Dict]:
+    """Pick k of the ranked docs by maximal marginal relevance.
+
+    Each step takes the doc maximizing mmr_lambda * relevance - (1 - mmr_lambda) * (highest
+    similarity to an already selected doc), so near-duplicates of what is already in the
+    context lose out to other sources. Relevance comes from Chroma's squared L2 distance,
+    which for unit-length embeddings is 2 - 2 * cosine. Docs without embeddings keep rank order.
+    """
+    if len(docs) <= k or any(doc.get("embedding") is None for doc in docs):
+        return docs[:k]
+
+    vectors = np.asarray([doc["embedding"] for doc in docs], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ vectors.T
+    relevance = 1.0 - np.asarray([doc.get("distance", 0.0) for doc in docs], dtype=np.float32) / 2.0
+
+    selected = [int(np.argmax(relevance))]
+    candidates = [i for i in range(len(docs)) if i != selected[0]]
+    while len(selected) < k and candidates:
+        redundancy = similarity[np.ix_(candidates, selected)].max(axis=1)
+        scores = mmr_lambda * relevance[candidates] - (1.0 - mmr_lambda) * redundancy
+        best = candidates.pop(int(np.argmax(scores)))
+        selected.append(best)
+    return [docs[i] for i in selected]
+
+def _merge_overlap(first: str, second: str) -> str:
+    """Join two consecutive chunks, dropping the text second repeats from the end of first"""
+    for size in range(min(len(first), len(second), MAX_STITCH_OVERLAP), MIN_STITCH_OVERLAP - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+def stitch_chunks(docs: List[Dict]) -> List[Dict]:
+    """Merge chunks of one file with consecutive chunk_index values into single spans.
+
+    Returns [{"text", "file_id", "chunks", "rank"}] ordered by the best rank of the chunks in
+    each span. Chunks without file_id/chunk_index metadata become spans of their own.
+    """
+    spans = []
+    seen = set()
+    indexed = []
+    for rank, doc in enumerate(docs):
+        meta = doc.get("meta") or {}
+        if doc.get("id") in seen:
+            continue
+        seen.add(doc.get("id"))
+        if meta.get("file_id") is not None and isinstance(meta.get("chunk_index"), int):
+            indexed.append((meta["file_id"], meta["chunk_index"], rank, doc["text"]))
+        else:
+            spans.append({"text": doc["text"], "file_id": meta.get("file_id"), "chunks": [], "rank": rank})
+
+    current = None
+    for file_id, chunk_index, rank, text in sorted(indexed):
+        if current is not None and current["file_id"] == file_id and current["chunks"][-1] == chunk_index - 1:
+            current["text"] = _merge_overlap(current["text"], text)
+            current["chunks"].append(chunk_index)
+            current["rank"] = min(current["rank"], rank)
+        else:
+            current = {"text": text, "file_id": file_id, "chunks": [chunk_index], "rank": rank}
+            spans.append(current)
+
+    return sorted(spans, key=lambda span: span["rank"])
+
+def assemble_context(docs: List[Dict], top_k: int, budget_chars: int, mmr_lambda: float) -> str:
+    """Turn ranked retrieval results into prompt context.
+
+    Selects top_k docs by MMR, stitches neighbouring chunks into de-overlapped spans, then adds
+    spans in rank order while they fit in budget_chars. If even the best span is too long it
+    is truncated rather than dropped.
+    """
+    spans = stitch_chunks(select_mmr(docs, top_k, mmr_lambda))
+    parts = []
+    used = 0
+    for span in spans:
+        separator = 2 if parts else 0
+        if used + separator + len(span["text"]) > budget_chars:
+            if not parts:
+                parts.append(span["text"][:budget_chars])
+                used = len(parts[0])
+            continue
+        parts.append(span["text"])
+        used += separator + len(span["text"])
+    return "\n\n".join(parts)
@@ -0,0 +1,101 @@
+import hashlib
+from itertools import islice
+from typing import Dict
+from core.embeddings import embed_texts
+from core.text_extractor import iter_pdf_pages, iter_text_file, chunk_text_stream
+from core.tracing import span
+from core.vectorstore import (
+    get_document_chunk_metas, get_chunk_embeddings, upsert_document_chunks,
+    update_chunk_metadata, delete_chunks
+)
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger("document_ingest")
+
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 80
+
+def _chunk_index(chunk_id: str) -> int:
+    return int(chunk_id.rsplit("-", 1)[1])
+
+def _iter_chunks(path: str, is_pdf: bool):
+    blocks = iter_pdf_pages(path) if is_pdf else iter_text_file(path, settings.UPLOAD_CHUNK_BYTES)
+    return chunk_text_stream(blocks, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+
+def ingest_document(path: str, is_pdf: bool, file_id: str, source: str) -> Dict[str, int]:
+    """Chunk a saved file and sync its chunks into the vector store under file_id.
+
+    Chunk ids are positional (<file_id>-<n>) and each chunk's metadata carries a chunk_hash,
+    so re-ingesting a modified document only writes chunks whose text changed. A changed
+    chunk whose text was stored elsewhere in the document reuses that embedding instead of
+    being re-embedded, and chunks past the new end are removed. Work is done
+    INGEST_BATCH_SIZE chunks at a time so memory stays bounded.
+
+    When file_id already has chunks, the whole file is decoded and chunked once before any
+    of them is touched, so a file that fails to decode or parse, or holds no text, raises
+    (or returns chunks=0) with the stored chunks unchanged.
+    """
+    existing = get_document_chunk_metas(file_id)
+    if existing:
+        with span("ingest_validate"):
+            if not sum(1 for _ in _iter_chunks(path, is_pdf)):
+                logger.warning("Replacement for doc %s has no text, keeping its chunks", file_id)
+                return {"chunks": 0, "embedded": 0, "reused": 0, "unchanged": 0, "removed": 0}
+
+    chunks = _iter_chunks(path, is_pdf)
+    # Stored embeddings by chunk text hash; an entry is dropped once its chunk is overwritten
+    by_hash = {meta.get("chunk_hash"): chunk_id for chunk_id, meta in existing.items() if meta.get("chunk_hash")}
+    stats = {"chunks": 0, "embedded": 0, "reused": 0, "unchanged": 0, "removed": 0}
+
+    while batch := list(islice(chunks, settings.INGEST_BATCH_SIZE)):
+        start = stats["chunks"]
+        ids = [f"{file_id}-{start + i}" for i in range(len(batch))]
+        hashes = [hashlib.sha256(chunk.encode("utf-8")).hexdigest() for chunk in batch]
+        metas = [
+            {"source": source, "chunk_index": start + i, "file_id": file_id, "chunk_hash": hashes[i]}
+            for i in range(len(batch))
+        ]
+
+        changed, renamed = [], []
+        for i, chunk_id in enumerate(ids):
+            old = existing.get(chunk_id)
+            if old is None or old.get("chunk_hash") != hashes[i]:
+                changed.append(i)
+            elif old.get("source") != source:
+                renamed.append(i)
+
+        if changed:
+            stored = get_chunk_embeddings(list({by_hash[hashes[i]] for i in changed if hashes[i] in by_hash}))
+            embeddings = {i: stored[by_hash[hashes[i]]] for i in changed if by_hash.get(hashes[i]) in stored}
+            to_embed = [i for i in changed if i not in embeddings]
+            if to_embed:
+                embeddings.update(zip(to_embed, embed_texts([batch[i] for i in to_embed])))
+
+            upsert_document_chunks(
+                ids=[ids[i] for i in changed],
+                chunks=[batch[i] for i in changed],
+                embeddings=[embeddings[i] for i in changed],
+                metas=[metas[i] for i in changed]
+            )
+            for i in changed:
+                old_hash = existing.get(ids[i], {}).get("chunk_hash")
+                if by_hash.get(old_hash) == ids[i]:
+                    del by_hash[old_hash]
+            stats["embedded"] += len(to_embed)
+            stats["reused"] += len(changed) - len(to_embed)
+
+        if renamed:
+            update_chunk_metadata([ids[i] for i in renamed], [metas[i] for i in renamed])
+        stats["unchanged"] += len(batch) - len(changed)
+        stats["chunks"] += len(batch)
+
+    stale = [chunk_id for chunk_id in existing if _chunk_index(chunk_id) >= stats["chunks"]]
+    delete_chunks(stale)
+    stats["removed"] = len(stale)
+
+    logger.info(
+        "✅ Indexed doc %s: %s chunks (%s embedded, %s reused, %s unchanged, %s removed)",
+        file_id, stats["chunks"], stats["embedded"], stats["reused"], stats["unchanged"], stats["removed"]
+    )
+    return stats
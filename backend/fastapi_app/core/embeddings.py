@@ -1,73 +1,151 @@
-from sentence_transformers import SentenceTransformer # type: ignore
+from utils.config import settings
 from utils.logger import get_logger
+from core.tracing import span
 import numpy as np
 
 logger = get_logger("embeddings")
 
+EMBEDDING_DIMENSIONS = 384
+EMBEDDING_BACKENDS = ("sentence-transformers", "hashing")
+MODEL_NAME = "all-MiniLM-L6-v2"
+# Space of vectors from the sentence-transformer model; indexes that predate recorded spaces hold these
+MODEL_EMBEDDING_SPACE = f"sentence-transformers/{MODEL_NAME}:{EMBEDDING_DIMENSIONS}"
+
+_PRIME = np.uint64(0x100000001B3)
+_MIX_1 = np.uint64(0xFF51AFD7ED558CCD)
+_MIX_2 = np.uint64(0xC4CEB9FE1A85EC53)
+_SEED = 0x9E3779B97F4A7C15
+
+def _mix64(h: np.ndarray) -> np.ndarray:
+    """MurmurHash3's 64-bit finalizer, so every input bit reaches the bucket and sign bits"""
+    h = h ^ (h >> np.uint64(33))
+    h = h * _MIX_1
+    h = h ^ (h >> np.uint64(33))
+    h = h * _MIX_2
+    return h ^ (h >> np.uint64(33))
+
+class HashingEmbedder:
+    """Model-free embedder: signed feature hashing of character n-grams.
+    
+    Text is lowercased, whitespace-collapsed and padded with a space on each side, then every
+    byte n-gram with length in ngram_range is hashed into one of `dimensions` buckets with a +1
+    or -1 sign, and each vector is L2-normalized. Hashes are computed for all texts at once over
+    one concatenated buffer, so a batch costs a few NumPy passes rather than a loop per n-gram.
+    The hash is fixed arithmetic, so vectors are identical across processes and machines.
+    """
+    
+    name = "hashing-ngram-v1"
+    
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS, ngram_range: tuple = (3, 5)):
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+    
+    def encode(self, texts: list) -> np.ndarray:
+        docs = [(" " + " ".join(text.lower().split()) + " ").encode("utf-8") for text in texts]
+        lengths = np.fromiter(map(len, docs), dtype=np.int64, count=len(docs))
+        data = np.frombuffer(b"".join(docs), dtype=np.uint8).astype(np.uint64)
+        rows = np.repeat(np.arange(len(docs)), lengths)
+        # End of each byte's own text, so n-grams never span two texts
+        ends = np.repeat(np.cumsum(lengths), lengths)
+        positions = np.arange(len(data))
+        
+        min_n, max_n = self.ngram_range
+        counts = np.zeros(len(docs) * self.dimensions, dtype=np.float64)
+        hashes = np.zeros(len(data), dtype=np.uint64)
+        for n in range(1, max_n + 1):
+            # hashes[i] covers data[i:i + n]
+            hashes = hashes[:len(data) - n + 1] * _PRIME + data[n - 1:]
+            if n < min_n:
+                continue
+            valid = positions[:len(hashes)] + n <= ends[:len(hashes)]
+            mixed = _mix64(hashes[valid] ^ np.uint64((_SEED * n) % 2**64))
+            buckets = (mixed % np.uint64(self.dimensions)).astype(np.int64)
+            signs = np.where(mixed >> np.uint64(63), -1.0, 1.0)
+            counts += np.bincount(rows[:len(hashes)][valid] * self.dimensions + buckets, weights=signs, minlength=counts.size)
+        
+        vectors = counts.reshape(len(docs), self.dimensions).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
 class LocalEmbedder:
-    def __init__(self):
+    """Embeds text with the configured backend.
+    
+    "sentence-transformers" loads all-MiniLM-L6-v2; if the model cannot be loaded the embedder
+    runs degraded on the hashing backend, and the vector store refuses writes so a temporary
+    load failure never stamps an index with the wrong space. "hashing" never loads a model.
+    The two produce vectors in different spaces, which the vector store refuses to mix (see
+    embedding_space).
+    """
+    
+    def __init__(self, backend: str):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}; expected one of {', '.join(EMBEDDING_BACKENDS)}")
+        self.backend = backend
         self.model = None
-        self.model_name = "all-MiniLM-L6-v2"  
+        self.model_name = MODEL_NAME
         self.is_loaded = False
-        self.load_model()
+        self.hashing = HashingEmbedder(EMBEDDING_DIMENSIONS)
+        if backend == "sentence-transformers":
+            self.load_model()
+        else:
+            logger.info("🔢 Using the %s hashing embedder", self.hashing.name)
     
     def load_model(self):
-        """Load the local embedding model"""
+        """Load the local embedding model, or fall back to the hashing embedder"""
         try:
-            logger.info(f"🚀 Loading local embedding model: {self.model_name}")
+            # Imported here so the hashing backend runs without torch installed
+            from sentence_transformers import SentenceTransformer # type: ignore
+            logger.info("🚀 Loading local embedding model: %s", self.model_name)
             self.model = SentenceTransformer(self.model_name)
             self.is_loaded = True
             logger.info("✅ Local embedding model loaded successfully!")
-            logger.info(f"📊 Model dimensions: {self.model.get_sentence_embedding_dimension()}")
+            logger.info("📊 Model dimensions: %s", self.model.get_sentence_embedding_dimension())
         except Exception as e:
-            logger.error(f"❌ Failed to load embedding model: {str(e)}")
+            logger.error("❌ Failed to load embedding model: %s", e)
+            logger.warning("⚠️ Running degraded on the %s hashing embedder; indexing is refused until %s loads", self.hashing.name, self.model_name)
             self.is_loaded = False
-            raise e
+    
+    @property
+    def degraded(self) -> bool:
+        return self.backend == "sentence-transformers" and not self.is_loaded
+    
+    @property
+    def space(self) -> str:
+        """Identifies the vector space embeddings come from; vectors from different spaces are not comparable"""
+        if self.is_loaded:
+            return MODEL_EMBEDDING_SPACE
+        return f"{self.hashing.name}:{EMBEDDING_DIMENSIONS}"
     
     def embed_texts(self, texts: list) -> list:
         """Generate embeddings for a list of texts"""
         if not texts:
             return []
-            
+        
         if not self.is_loaded or self.model is None:
-            logger.error("❌ Model not loaded, using emergency fallback")
-            return self._fallback_embeddings(texts)
+            with span("embedding_encode"):
+                return self.hashing.encode(texts).tolist()
         
-        logger.info(f"🔄 Generating embeddings for {len(texts)} text chunks")
+        logger.debug("🔄 Generating embeddings for %s text chunks", len(texts))
         
         try:
             # Generate embeddings
-            embeddings = self.model.encode(
-                texts,
-                convert_to_tensor=False,
-                normalize_embeddings=True,
-                show_progress_bar=False
-            ).tolist()
+            with span("embedding_encode"):
+                embeddings = self.model.encode(
+                    texts,
+                    convert_to_tensor=False,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                ).tolist()
             
-            logger.info(f"✅ Successfully generated {len(embeddings)} embeddings")
-            logger.info(f"📐 Embedding dimensions: {len(embeddings[0])}D")
+            logger.debug("✅ Successfully generated %s embeddings", len(embeddings))
             return embeddings
-            
-        except Exception as e:
-            logger.error(f"❌ Embedding generation failed: {str(e)}")
-            logger.warning("🔄 Using fallback embeddings")
-            return self._fallback_embeddings(texts)
-    
-    def _fallback_embeddings(self, texts: list) -> list:
-        """Simple fallback if model fails"""
-        logger.warning("Using fallback embedding method")
-        embeddings = []
-        embedding_size = 384  
         
-        for i, text in enumerate(texts):
-            np.random.seed(hash(text) % 10000)
-            embedding = np.random.normal(0, 1, embedding_size).tolist()
-            embeddings.append(embedding)
-            
-        logger.info(f"📦 Generated {len(embeddings)} fallback embeddings")
-        return embeddings
+        except Exception as e:
+            # No fallback here: vectors from another space would silently corrupt the index
+            logger.error("❌ Embedding generation failed: %s", e)
+            raise
 
-local_embedder = LocalEmbedder()
+local_embedder = LocalEmbedder(settings.EMBEDDING_BACKEND)
 
 def embed_texts(texts: list[str]) -> list[list[float]]:
     """
@@ -75,10 +153,20 @@ def embed_texts(texts: list[str]) -> list[list[float]]:
     """
     return local_embedder.embed_texts(texts)
 
+def embedding_space() -> str:
+    return local_embedder.space
+
+def embedding_degraded() -> bool:
+    """True while the configured model is not loaded and embeddings come from the hashing fallback"""
+    return local_embedder.degraded
+
 def get_model_info():
     """Get information about the current embedding model"""
     return {
-        "model_name": local_embedder.model_name,
+        "backend": local_embedder.backend,
+        "model_name": local_embedder.model_name if local_embedder.is_loaded else local_embedder.hashing.name,
         "is_loaded": local_embedder.is_loaded,
-        "dimensions": 384 if local_embedder.is_loaded else "unknown"
-    }
\ No newline at end of file
+        "degraded": local_embedder.degraded,
+        "space": local_embedder.space,
+        "dimensions": EMBEDDING_DIMENSIONS
+    }
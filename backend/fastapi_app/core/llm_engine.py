@@ -1,36 +1,92 @@
+import google.ai.generativelanguage as glm
 import google.generativeai as genai
 import requests
+import time
+from requests.adapters import HTTPAdapter
 from utils.config import settings
 from utils.logger import get_logger
+from core.run_context import RunContext, RunCancelled, DeadlineExceeded
+from core.cache import LRUCache
+from core.metrics import registry, register_cache
+from core.tracing import span
+from core.usage import estimate_tokens, cost_usd
+from core.model_router import is_model_failure, model_router, validate_model
+
+LLM_TOKENS = registry.counter("llm_tokens_total", "Gemini tokens by model and kind; estimated=true where the response had no usage metadata")
+
+def _response_usage(response, model_name: str, prompt: str, text: str) -> dict:
+    """Token usage and cost of one response, estimated from text length when Gemini reports none"""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    completion_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    estimated = not (prompt_tokens or completion_tokens)
+    if estimated:
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(text)
+    
+    for kind, count in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+        if count:
+            LLM_TOKENS.inc(count, model=model_name, kind=kind, estimated=str(estimated).lower())
+    return {
+        "model": model_name,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "cost_usd": round(cost_usd(model_name, prompt_tokens, completion_tokens), 6),
+        "estimated": estimated,
+    }
 
 logger = get_logger("llm_engine")
 
-def call_gemini(prompt: str, model: str = "gemini-2.5-flash", temperature: float = 0.7, max_tokens: int = 1024, api_key: str = None):
+# GenerativeService clients per API key; genai.configure() would set one key for every thread in the process
+MAX_GEMINI_CLIENTS = 64
+_gemini_clients = LRUCache(max_entries=MAX_GEMINI_CLIENTS)
+
+def _gemini_client(api_key: str) -> glm.GenerativeServiceClient:
+    client = _gemini_clients.get(api_key)
+    if client is None:
+        if settings.GEMINI_API_ENDPOINT:
+            client = glm.GenerativeServiceClient(transport="rest", client_options={"api_key": api_key, "api_endpoint": settings.GEMINI_API_ENDPOINT})
+        else:
+            client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        _gemini_clients.set(api_key, client)
+    return client
+
+def _generative_model(model_name: str, api_key: str) -> genai.GenerativeModel:
+    """A GenerativeModel bound to api_key rather than to the process-wide default client"""
+    model_client = genai.GenerativeModel(model_name)
+    # GenerativeModel only creates its client lazily from the global configuration when none is set
+    model_client._client = _gemini_client(api_key)
+    return model_client
+
+def call_gemini(prompt: str, model: str = "gemini-2.5-flash", temperature: float = 0.7, max_tokens: int = 1024, api_key: str = None, run_context: RunContext = None):
+    """
+    Gemini call with API key support from request.
+    When run_context is given, no call (including the fallback) starts once the run is cancelled or past its deadline.
     """
-    Gemini call with API key support from request
+    return call_gemini_detailed(prompt, model, temperature, max_tokens, api_key, run_context)["text"]
+
+def call_gemini_detailed(prompt: str, model: str = "gemini-2.5-flash", temperature: float = 0.7, max_tokens: int = 1024, api_key: str = None, run_context: RunContext = None) -> dict:
     """
-    logger.info(f"Calling Gemini LLM with model {model}, temperature {temperature}")
+    Same as call_gemini, but returns {"text", "model", "usage"} where model is the model that
+    actually answered (the fallback, if it was used) and usage holds its token counts and cost.
+    Raises ValueError for models outside SUPPORTED_MODELS; route "auto" through model_router first.
+    """
+    logger.info("Calling Gemini LLM with model %s, temperature %s", model, temperature)
+    validate_model(model, allow_auto=False)
     
+    effective_api_key = api_key or settings.GEMINI_API_KEY
     try:
-        effective_api_key = api_key or settings.GEMINI_API_KEY
         if not effective_api_key:
             raise ValueError("No Gemini API key provided")
         
-        genai.configure(api_key=effective_api_key)
-        
-        supported_models = [
-            'gemini-2.5-pro', 'gemini-2.5-flash', 'gemini-2.5-flash-lite',
-        ]
+        if run_context is not None:
+            run_context.check()
         
-        if model in supported_models:
-            model_name = model
-        else:
-            model_name = "gemini-2.5-flash"
-            logger.warning(f"Model {model} not recognized, using {model_name} instead")
-        
-        logger.info(f"Using Gemini model: {model_name}")
+        model_name = model
+        logger.debug("Using Gemini model: %s", model_name)
         
-        model_client = genai.GenerativeModel(model_name)
+        model_client = _generative_model(model_name, effective_api_key)
         
         generation_config = {
             "temperature": temperature,
@@ -39,10 +95,19 @@ def call_gemini(prompt: str, model: str = "gemini-2.5-flash", temperature: float
             "max_output_tokens": max_tokens,
         }
         
-        response = model_client.generate_content(
-            prompt,
-            generation_config=generation_config
-        )
+        started_at = time.perf_counter()
+        try:
+            with span("gemini_call", model=model_name):
+                response = model_client.generate_content(
+                    prompt,
+                    generation_config=generation_config
+                )
+        except Exception as call_error:
+            # One sample per request, for the requested model only; the fallback is not counted
+            if is_model_failure(call_error):
+                model_router.observe(model_name, time.perf_counter() - started_at, ok=False)
+            raise
+        model_router.observe(model_name, time.perf_counter() - started_at, ok=True)
         
         if hasattr(response, 'text'):
             text = response.text
@@ -51,50 +116,94 @@ def call_gemini(prompt: str, model: str = "gemini-2.5-flash", temperature: float
         else:
             text = str(response)
             
-        logger.info(f"Successfully received response from {model_name}")
-        return text.strip()
+        logger.info("Successfully received response from %s", model_name)
+        return {"text": text.strip(), "model": model_name, "usage": _response_usage(response, model_name, prompt, text)}
         
+    except (DeadlineExceeded, RunCancelled):
+        raise
     except Exception as e:
-        logger.error(f"Gemini API call failed with model {model}: {str(e)}")
+        logger.error("Gemini API call failed with model %s: %s", model, e)
+        if not effective_api_key:
+            return {"text": f"Error calling LLM: {str(e)}", "model": model, "usage": None}
         
         try:
+            if run_context is not None:
+                run_context.check()
             logger.info("Trying fallback with gemini-2.5-flash")
-            fallback_model = genai.GenerativeModel("gemini-2.5-flash")
-            response = fallback_model.generate_content(prompt)
-            return response.text.strip()
+            fallback_model = _generative_model("gemini-2.5-flash", effective_api_key)
+            with span("gemini_call", model="gemini-2.5-flash"):
+                response = fallback_model.generate_content(prompt)
+            text = response.text
+            return {"text": text.strip(), "model": "gemini-2.5-flash", "usage": _response_usage(response, "gemini-2.5-flash", prompt, text)}
+        except (DeadlineExceeded, RunCancelled):
+            raise
         except Exception as fallback_error:
-            logger.error(f"Gemini fallback also failed: {str(fallback_error)}")
-            return f"Error calling LLM: {str(e)}"
+            logger.error("Gemini fallback also failed: %s", fallback_error)
+            return {"text": f"Error calling LLM: {str(e)}", "model": model, "usage": None}
+
+def _build_http_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=settings.WEB_SEARCH_POOL_SIZE, pool_maxsize=settings.WEB_SEARCH_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-def web_search(query: str, api_key: str = None):
+# Shared keep-alive session and TTL cache for SerpAPI lookups
+_http_session = _build_http_session()
+_search_cache = LRUCache(max_entries=settings.WEB_SEARCH_CACHE_SIZE, ttl_seconds=settings.WEB_SEARCH_CACHE_TTL_SECONDS)
+register_cache("web_search", _search_cache)
+
+def web_search(query: str, api_key: str = None, run_context: RunContext = None, max_results: int = None):
     """
-    Web search function - currently not used in workflow but kept for compatibility
+    Search the web through SerpAPI, returning up to max_results organic results.
+    Results are cached per query for WEB_SEARCH_CACHE_TTL_SECONDS.
     """
     search_key = api_key or settings.SERPAPI_KEY
     if not search_key:
         logger.info("No SerpAPI key configured — skipping web search")
         return []
     
-    logger.info(f"Performing web search for: {query}")
+    max_results = max_results or settings.WEB_SEARCH_MAX_RESULTS
+    cache_key = (" ".join(query.lower().split()), max_results)
+    cached = _search_cache.get(cache_key)
+    if cached is not None:
+        logger.debug("Web search cache hit for: %.200s", query)
+        return cached
+    
+    logger.debug("Performing web search for: %.200s", query)
+    
+    if run_context is not None:
+        run_context.check()
     
     try:
         params = {
             "q": query,
             "api_key": search_key,
-            "engine": "google"
+            "engine": "google",
+            "num": max_results
         }
         
-        resp = requests.get("https://serpapi.com/search.json", params=params, timeout=15)
+        timeout = settings.WEB_SEARCH_TIMEOUT_SECONDS
+        if run_context is not None:
+            timeout = run_context.time_limit(timeout)
+        with span("serpapi_call"):
+            resp = _http_session.get(settings.SERPAPI_URL, params=params, timeout=timeout)
         if resp.status_code != 200:
-            logger.warning(f"SerpAPI returned status {resp.status_code}: {resp.text}")
+            logger.warning("SerpAPI returned status %s: %s", resp.status_code, resp.text)
             return []
             
         data = resp.json()
-        results = data.get("organic_results", [])
+        results = data.get("organic_results", [])[:max_results]
         
-        logger.info(f"Web search returned {len(results)} results")
-        return results[:3]
+        logger.info("Web search returned %s results", len(results))
+        if results:
+            _search_cache.set(cache_key, results)
+        return results
         
     except Exception as e:
-        logger.error(f"Web search failed: {str(e)}")
-        return []
\ No newline at end of file
+        logger.error("Web search failed: %s", e)
+        return []
+
+def format_web_results(results: list) -> str:
+    """Render search results as bullet points for inclusion in a prompt"""
+    return "\n".join([f"• {result.get('snippet', 'No snippet available')}" for result in results])
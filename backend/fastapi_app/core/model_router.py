@@ -0,0 +1,157 @@
+import requests
+import threading
+import time
+from collections import deque
+from typing import Dict
+from core.metrics import registry
+from core.usage import estimate_tokens
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger("model_router")
+
+# Cheapest and fastest first
+SUPPORTED_MODELS = ("gemini-2.5-flash-lite", "gemini-2.5-flash", "gemini-2.5-pro")
+AUTO_MODEL = "auto"
+
+ROUTE_DECISIONS = registry.counter("llm_route_decisions_total", "Model routing decisions by chosen model and reason")
+
+def validate_model(model: str, allow_auto: bool = True):
+    if model in SUPPORTED_MODELS or (allow_auto and model == AUTO_MODEL):
+        return
+    allowed = SUPPORTED_MODELS + ((AUTO_MODEL,) if allow_auto else ())
+    raise ValueError(f"Unsupported model {model!r}; expected one of {', '.join(allowed)}")
+
+# gRPC status names that mean the service, not the request, is at fault. UNKNOWN is left out on
+# purpose: api_core raises it for errors it cannot classify, which says nothing about the model.
+TRANSIENT_STATUSES = ("UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL")
+
+def is_model_failure(error: Exception) -> bool:
+    """Whether a failed call says something about the model's health.
+
+    Only server-side and transient failures count: 5xx responses, the TRANSIENT_STATUSES
+    (UNAVAILABLE, DEADLINE_EXCEEDED and INTERNAL), timeouts and dropped connections. Client
+    errors such as an invalid or expired API key or a rejected prompt are the caller's problem
+    and must not degrade the model for everyone else, and neither do UNKNOWN errors.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError, requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    # google.api_core errors carry the HTTP status as .code and the gRPC status as .grpc_status_code
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code >= 500
+    status = getattr(getattr(error, "grpc_status_code", None), "name", None)
+    return status in TRANSIENT_STATUSES
+
+class ModelRouter:
+    """Picks a Gemini model per call from prompt size, recent latency and error rate, and an SLO.
+
+    Each request's outcome is fed back once through observe(): successes and model failures
+    (see is_model_failure), never client errors. Only the last `window` outcomes from
+    the last window_seconds count. A model is degraded once at least min_samples of them exist
+    and its error rate reaches error_rate_threshold; degraded models are skipped, even when a
+    node names one explicitly, until their failures age out of the window.
+
+    For model "auto" the preference order follows prompt size (small prompts never start at
+    pro), and the first healthy model whose observed p90 latency fits the SLO wins. Models
+    without enough samples are assumed to fit, so traffic keeps probing them.
+    """
+
+    def __init__(self, window: int, window_seconds: float, min_samples: int, error_rate_threshold: float, small_prompt_tokens: int, large_prompt_tokens: int):
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.error_rate_threshold = error_rate_threshold
+        self.small_prompt_tokens = small_prompt_tokens
+        self.large_prompt_tokens = large_prompt_tokens
+        # (monotonic time, ok, seconds) per call
+        self._outcomes = {model: deque(maxlen=window) for model in SUPPORTED_MODELS}
+        self._lock = threading.Lock()
+
+    def observe(self, model: str, seconds: float, ok: bool):
+        if model not in self._outcomes:
+            return
+        with self._lock:
+            self._outcomes[model].append((time.monotonic(), ok, seconds))
+
+    def _health(self, model: str) -> Dict:
+        cutoff = time.monotonic() - self.window_seconds
+        outcomes = [ok for at, ok, _ in self._outcomes[model] if at >= cutoff]
+        latencies = sorted(seconds for at, ok, seconds in self._outcomes[model] if ok and at >= cutoff)
+        error_rate = outcomes.count(False) / len(outcomes) if outcomes else 0.0
+        p90 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))] * 1000 if len(latencies) >= self.min_samples else None
+        return {
+            "samples": len(outcomes),
+            "error_rate": round(error_rate, 3),
+            "p90_ms": round(p90, 1) if p90 is not None else None,
+            "degraded": len(outcomes) >= self.min_samples and error_rate >= self.error_rate_threshold,
+        }
+
+    def health(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {model: self._health(model) for model in SUPPORTED_MODELS}
+
+    def _preference(self, prompt_tokens: int) -> list:
+        lite, flash, pro = SUPPORTED_MODELS
+        if prompt_tokens <= self.small_prompt_tokens:
+            return [lite, flash, pro]
+        if prompt_tokens >= self.large_prompt_tokens:
+            return [pro, flash, lite]
+        return [flash, pro, lite]
+
+    def route(self, requested: str, prompt: str, slo_ms: float | None = None) -> Dict:
+        """Return the routing decision: {"model", "requested", "reason", "prompt_tokens", "slo_ms", "health"}"""
+        validate_model(requested)
+        prompt_tokens = estimate_tokens(prompt)
+        health = self.health()
+        healthy = [model for model in SUPPORTED_MODELS if not health[model]["degraded"]]
+
+        def fits_slo(model: str) -> bool:
+            p90 = health[model]["p90_ms"]
+            return slo_ms is None or p90 is None or p90 <= slo_ms
+
+        if requested != AUTO_MODEL:
+            if requested in healthy:
+                model, reason = requested, "configured"
+            else:
+                # Nearest healthy model in capability order, preferring the cheaper side
+                order = sorted(SUPPORTED_MODELS, key=lambda m: abs(SUPPORTED_MODELS.index(m) - SUPPORTED_MODELS.index(requested)))
+                model = next((m for m in order if m in healthy), requested)
+                reason = "configured_degraded"
+        else:
+            preference = [m for m in self._preference(prompt_tokens) if m in healthy]
+            model = next((m for m in preference if fits_slo(m)), None)
+            if model is not None:
+                reason = "prompt_size" if slo_ms is None else "slo"
+            elif preference:
+                # Nothing meets the SLO; take whichever is currently fastest
+                model = min(preference, key=lambda m: health[m]["p90_ms"])
+                reason = "slo_unmet"
+            else:
+                model = min(SUPPORTED_MODELS, key=lambda m: health[m]["error_rate"])
+                reason = "all_degraded"
+
+        ROUTE_DECISIONS.inc(model=model, reason=reason)
+        if model != requested:
+            logger.info("🧭 Routed %s request (%s prompt tokens) to %s: %s", requested, prompt_tokens, model, reason)
+        return {
+            "model": model,
+            "requested": requested,
+            "reason": reason,
+            "prompt_tokens": prompt_tokens,
+            "slo_ms": slo_ms,
+            "health": {m: {"p90_ms": health[m]["p90_ms"], "error_rate": health[m]["error_rate"]} for m in SUPPORTED_MODELS},
+        }
+
+model_router = ModelRouter(
+    window=settings.ROUTER_WINDOW,
+    window_seconds=settings.ROUTER_WINDOW_SECONDS,
+    min_samples=settings.ROUTER_MIN_SAMPLES,
+    error_rate_threshold=settings.ROUTER_ERROR_RATE_THRESHOLD,
+    small_prompt_tokens=settings.ROUTER_SMALL_PROMPT_TOKENS,
+    large_prompt_tokens=settings.ROUTER_LARGE_PROMPT_TOKENS,
+)
+
+registry.gauge(
+    "llm_model_error_rate", "Recent Gemini error rate per model, as seen by the router",
+    lambda: {(("model", model),): stats["error_rate"] for model, stats in model_router.health().items()}
+)
@@ -0,0 +1,160 @@
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict
+from core.metrics import registry
+from core.tracing import Trace, active_threads
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger("profiler")
+
+PROFILE_CAPTURES = registry.counter("profile_captures_total", "Profiles captured, by kind")
+
+MAX_STACK_DEPTH = 64
+# Frames reported per capture in the self-time summary
+TOP_FRAMES = 25
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def folded_stack(frame) -> str:
+    """A frame's call stack, outermost first, in flamegraph folded format ("a;b;c")"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+def sample_process(seconds: float, interval_seconds: float) -> Dict[str, int]:
+    """Sample the stack of every other thread in the process for `seconds`.
+
+    Returns sample counts keyed by folded stack, each prefixed with the thread's name.
+    Blocking; run it off the event loop.
+    """
+    own_id = threading.get_ident()
+    names = {}
+    stacks = Counter()
+    stop_at = time.monotonic() + seconds
+    while time.monotonic() < stop_at:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            if thread_id not in names:
+                names.update((thread.ident, thread.name) for thread in threading.enumerate())
+            stacks[f"{names.get(thread_id, thread_id)};{folded_stack(frame)}"] += 1
+        time.sleep(interval_seconds)
+    return dict(stacks)
+
+class TraceSampler:
+    """Background thread that samples the stacks of threads running traced work.
+
+    Threads inside tracing.activate() (workflow nodes, document ingestion) are sampled every
+    interval_seconds and the stacks counted on their Trace, so a slow run can be explained
+    after the fact without profiling every run in advance. Idle when nothing is traced.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is None and self.interval_seconds > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="trace-sampler", daemon=True)
+            self._thread.start()
+            logger.info("🔬 Sampling traced threads every %sms", self.interval_seconds * 1000)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            threads = active_threads()
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for thread_id, (trace, node_id) in threads.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    trace.record_sample(node_id, folded_stack(frame))
+
+class ProfileStore:
+    """Bounded ring buffer of profile captures.
+
+    Holds on-demand process samples and automatic captures of runs slower than slow_run_ms
+    (0 disables them). Once max_captures is reached the oldest capture is dropped.
+    """
+
+    def __init__(self, max_captures: int, slow_run_ms: float):
+        self.slow_run_ms = slow_run_ms
+        self._captures = deque(maxlen=max_captures)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, name: str, duration_ms: float, details: Dict, stacks: Dict[str, int]) -> Dict:
+        self_time = Counter()
+        for stack, count in stacks.items():
+            self_time[stack.rsplit(";", 1)[-1]] += count
+        capture = {
+            "id": next(self._ids),
+            "kind": kind,
+            "name": name,
+            "created_at": time.time(),
+            "duration_ms": round(duration_ms, 2),
+            "details": details,
+            "samples": sum(stacks.values()),
+            "top_frames": [{"frame": frame, "samples": count} for frame, count in self_time.most_common(TOP_FRAMES)],
+            "stacks": stacks,
+        }
+        with self._lock:
+            self._captures.append(capture)
+        PROFILE_CAPTURES.inc(kind=kind)
+        return capture
+
+    def capture_slow_run(self, kind: str, name: str, trace: Trace, details: Dict) -> Dict | None:
+        """Keep the trace's span breakdown and sampled stacks if it ran for at least slow_run_ms"""
+        duration_ms = trace.elapsed_ms()
+        if not self.slow_run_ms or duration_ms < self.slow_run_ms:
+            return None
+        stacks = {}
+        for (node_id, stack), count in trace.samples().items():
+            key = f"node {node_id};{stack}" if node_id else stack
+            stacks[key] = stacks.get(key, 0) + count
+        capture = self.add(kind, name, duration_ms, {**details, "spans": trace.breakdown()}, stacks)
+        logger.warning("🐢 Slow %s %s took %sms, saved profile %s", kind, name, duration_ms, capture["id"])
+        return capture
+
+    def list(self) -> list:
+        """Newest first, without stacks"""
+        with self._lock:
+            captures = list(self._captures)
+        return [
+            {key: value for key, value in capture.items() if key not in ("stacks", "top_frames")}
+            for capture in reversed(captures)
+        ]
+
+    def get(self, capture_id: int) -> Dict | None:
+        with self._lock:
+            return next((capture for capture in self._captures if capture["id"] == capture_id), None)
+
+def folded_text(capture: Dict) -> str:
+    """Capture stacks as flamegraph.pl / speedscope folded text, one "stack count" per line"""
+    lines = [f"{stack} {count}" for stack, count in sorted(capture["stacks"].items(), key=lambda item: -item[1])]
+    return "\n".join(lines) + "\n"
+
+trace_sampler = TraceSampler(interval_seconds=settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+
+profile_store = ProfileStore(
+    max_captures=settings.PROFILE_MAX_CAPTURES,
+    slow_run_ms=settings.PROFILE_SLOW_RUN_MS,
+)
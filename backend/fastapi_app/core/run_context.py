@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Any
+from starlette.concurrency import run_in_threadpool
+from core.admission import AdmissionRejected
+
+class RunCancelled(Exception):
+    """Raised when a run is cancelled, e.g. because the HTTP client disconnected"""
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a run or node exceeds its time budget"""
+
+class RunContext:
+    """Deadline and cancellation state shared by every node of a single workflow run"""
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, timeout_seconds: float | None = None):
+        self.timeout_seconds = timeout_seconds
+        self.deadline = time.monotonic() + timeout_seconds if timeout_seconds else None
+        self._cancelled = threading.Event()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+    
+    def cancel(self):
+        self._cancelled.set()
+    
+    def remaining(self) -> float | None:
+        """Seconds left before the run deadline, or None when the run has no deadline"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+    
+    def time_limit(self, timeout: float | None = None) -> float | None:
+        """The tighter of an operation's own timeout and the time left in the run"""
+        remaining = self.remaining()
+        if timeout is None:
+            return remaining
+        if remaining is None:
+            return timeout
+        return min(timeout, remaining)
+    
+    def check(self):
+        """Raise if the run was cancelled or its deadline has passed"""
+        if self.cancelled:
+            raise RunCancelled("Workflow run was cancelled")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceeded(f"Workflow run exceeded its {self.timeout_seconds}s deadline")
+    
+    def wait(self, future: Future, timeout: float | None = None, label: str = "operation") -> Any:
+        """Wait for a future, giving up on cancellation, on the run deadline or after timeout seconds.
+
+        The underlying work cannot be interrupted; it is abandoned and its result discarded.
+        """
+        limit = self.time_limit(timeout)
+        give_up_at = time.monotonic() + limit if limit is not None else None
+        
+        while True:
+            if self.cancelled:
+                raise RunCancelled("Workflow run was cancelled")
+            
+            wait_for = self.POLL_INTERVAL
+            if give_up_at is not None:
+                left = give_up_at - time.monotonic()
+                if left <= 0:
+                    raise DeadlineExceeded(f"{label} timed out after {limit:.1f}s")
+                wait_for = min(wait_for, left)
+            
+            done, _ = wait([future], timeout=wait_for)
+            if done:
+                return future.result()
+
+def run_status(error: Exception) -> str:
+    """Chat log status for a run that raised error"""
+    if isinstance(error, DeadlineExceeded):
+        return "timeout"
+    if isinstance(error, RunCancelled):
+        return "cancelled"
+    if isinstance(error, AdmissionRejected):
+        return "rejected"
+    return "error"
+
+async def run_until_disconnect(request, run_context: RunContext, func, /, *args, **kwargs) -> Any:
+    """Run a blocking function in the threadpool, cancelling run_context if the HTTP client disconnects"""
+    task = asyncio.ensure_future(run_in_threadpool(func, *args, **kwargs))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=0.5)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                run_context.cancel()
+                raise RunCancelled("Client disconnected")
+    finally:
+        if not task.done():
+            # The worker thread finishes on its own; retrieve its outcome so an abandoned run
+            # does not log "Task exception was never retrieved"
+            task.add_done_callback(_discard_outcome)
+
+def _discard_outcome(task: asyncio.Task):
+    if not task.cancelled():
+        task.exception()
@@ -1,32 +1,67 @@
+import codecs
 import fitz  
+from typing import Iterable, Iterator
 from utils.logger import get_logger
+from core.tracing import span
 
 logger = get_logger("text_extractor")
 
 def extract_text_from_pdf(path: str) -> str:
-    logger.info(f"Extracting text from {path}")
+    logger.info("Extracting text from %s", path)
     text = ""
-    with fitz.open(path) as doc:
+    with span("pdf_extract"), fitz.open(path) as doc:
         for page in doc:
             page_text = page.get_text()
             text += page_text + "\n"
-    logger.info(f"Extracted {len(text)} characters")
+    logger.info("Extracted %s characters", len(text))
     return text
 
+def iter_pdf_pages(path: str) -> Iterator[str]:
+    """Yield the text of a PDF one page at a time"""
+    logger.info("Extracting text from %s", path)
+    with fitz.open(path) as doc:
+        for page in doc:
+            with span("pdf_extract"):
+                page_text = page.get_text()
+            yield page_text + "\n"
+
+def iter_text_file(path: str, block_size: int = 1024 * 1024, encoding: str = "utf-8") -> Iterator[str]:
+    """Yield a text file's contents in decoded blocks of about block_size bytes"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
 def chunk_text(text: str, chunk_size: int = 800, overlap: int = 50):
+    return list(chunk_text_stream([text], chunk_size, overlap))
+
+def chunk_text_stream(blocks: Iterable[str], chunk_size: int = 800, overlap: int = 50) -> Iterator[str]:
+    """Chunk text arriving in blocks, yielding the same chunks chunk_text would for the joined text.
+
+    Only the unconsumed tail of the text is buffered, so memory stays bounded by one block
+    plus one chunk.
+    """
     if chunk_size <= 0:
         raise ValueError("chunk_size must be positive")
     if overlap >= chunk_size:
         overlap = chunk_size // 2  
+    step = chunk_size - overlap
 
-    chunks = []
-    start = 0
-    n = len(text)
-    while start < n:
-        end = min(start + chunk_size, n)
-        chunks.append(text[start:end].strip())
-        start += chunk_size - overlap
-        if start < 0:
-            start = 0
-    return [c for c in chunks if c]
+    buffer = ""
+    for block in blocks:
+        buffer += block
+        start = 0
+        while len(buffer) - start >= chunk_size:
+            chunk = buffer[start:start + chunk_size].strip()
+            if chunk:
+                yield chunk
+            start += step
+        buffer = buffer[start:]
 
+    start = 0
+    while start < len(buffer):
+        chunk = buffer[start:start + chunk_size].strip()
+        if chunk:
+            yield chunk
+        start += step
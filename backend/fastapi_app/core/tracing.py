@@ -0,0 +1,110 @@
+import contextvars
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict
+from core.metrics import registry
+
+SPAN_SECONDS = registry.histogram("span_duration_seconds", "Duration of traced operations by span name")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_node = contextvars.ContextVar("current_node", default=None)
+
+# Threads currently running traced work: thread ident -> (trace, node id). Read by the stack sampler
+_active_threads: Dict[int, tuple] = {}
+
+# Distinct stacks kept per trace; further new stacks are counted under "[other]"
+MAX_TRACE_STACKS = 2000
+
+class Trace:
+    """Span timings recorded during one workflow run, grouped by the node that produced them"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._spans = []
+        self._samples = Counter()
+        self._lock = threading.Lock()
+    
+    def record(self, name: str, seconds: float, node_id: str | None = None):
+        with self._lock:
+            self._spans.append((name, seconds, node_id))
+    
+    def node_timings(self, node_id: str) -> Dict[str, float]:
+        """Total milliseconds per span name for one node"""
+        timings = {}
+        with self._lock:
+            for name, seconds, span_node in self._spans:
+                if span_node == node_id:
+                    timings[f"{name}_ms"] = round(timings.get(f"{name}_ms", 0.0) + seconds * 1000, 2)
+        return timings
+    
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        """Total milliseconds per span name for every node; spans outside any node are under "" """
+        with self._lock:
+            node_ids = {span_node or "" for _, _, span_node in self._spans}
+        return {node_id: self.node_timings(node_id or None) for node_id in sorted(node_ids)}
+    
+    def record_sample(self, node_id: str | None, stack: str):
+        """Count one sampled stack of a thread working on this trace"""
+        key = (node_id or "", stack)
+        with self._lock:
+            if key not in self._samples and len(self._samples) >= MAX_TRACE_STACKS:
+                key = (node_id or "", "[other]")
+            self._samples[key] += 1
+    
+    def samples(self) -> Dict[tuple, int]:
+        """Sample counts keyed by (node id, folded stack)"""
+        with self._lock:
+            return dict(self._samples)
+    
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started_at) * 1000, 2)
+
+@contextmanager
+def span(name: str, **labels):
+    """Time a block: always into span_duration_seconds, and into the active trace if there is one"""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started_at
+        SPAN_SECONDS.observe(seconds, span=name, **labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(name, seconds, _current_node.get())
+
+@contextmanager
+def activate(trace: Trace, node_id: str | None = None):
+    """Make trace (and optionally a node id) current for spans recorded in this context"""
+    trace_token = _current_trace.set(trace)
+    node_token = _current_node.set(node_id)
+    thread_id = threading.get_ident()
+    previous = _active_threads.get(thread_id)
+    _active_threads[thread_id] = (trace, node_id)
+    try:
+        yield trace
+    finally:
+        if previous is None:
+            _active_threads.pop(thread_id, None)
+        else:
+            _active_threads[thread_id] = previous
+        _current_node.reset(node_token)
+        _current_trace.reset(trace_token)
+
+def active_threads() -> Dict[int, tuple]:
+    """Snapshot of thread ident -> (trace, node id) for threads inside activate()"""
+    return dict(_active_threads)
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+def bind(func, trace: Trace | None, node_id: str | None = None):
+    """Wrap func so it runs with trace and node_id active, e.g. when handed to a thread pool"""
+    if trace is None:
+        return func
+    
+    def bound(*args, **kwargs):
+        with activate(trace, node_id):
+            return func(*args, **kwargs)
+    return bound
@@ -0,0 +1,150 @@
+import hashlib
+import math
+import threading
+import time
+from typing import Dict
+from core.admission import AdmissionRejected
+from core.cache import LRUCache
+from core.metrics import registry
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger("usage")
+
+# USD per million (prompt, completion) tokens; list prices, override by editing here
+PRICES_PER_MILLION_TOKENS = {
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+}
+
+LLM_COST_USD = registry.counter("llm_cost_usd_total", "Estimated Gemini spend in USD, by model")
+LLM_QUOTA_ACTIONS = registry.counter("llm_quota_actions_total", "LLM calls downgraded or rejected for exceeding a token budget, by scope and action")
+
+class QuotaExceeded(AdmissionRejected):
+    """Raised when a session or API key has used up its token budget for the current window"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason, retry_after, status_code=429)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for when Gemini returns no usage metadata (about 4 characters per token)"""
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = PRICES_PER_MILLION_TOKENS.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+def api_key_id(api_key: str | None) -> str:
+    """Stable, non-reversible label for an API key; calls on the server key are labelled "server" """
+    if not api_key or api_key == settings.GEMINI_API_KEY:
+        return "server"
+    return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+def sum_usage(usages) -> Dict:
+    total = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost_usd": 0.0, "calls": 0}
+    for usage in usages:
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens", "cost_usd"):
+            total[field] += usage.get(field, 0)
+        total["calls"] += usage.get("calls", 1)
+    total["cost_usd"] = round(total["cost_usd"], 6)
+    return total
+
+class UsageTracker:
+    """Token and cost totals per model, session and API key, with per-window budgets.
+
+    Budgets apply to a fixed window of window_seconds. Once a session or key has used its
+    budget, further calls are either switched to downgrade_model or rejected with
+    QuotaExceeded, depending on over_budget. A budget of 0 disables that limit.
+    Only the most recent max_tracked sessions and keys are remembered.
+
+    The session budget is advisory: session ids are chosen by the client, so a caller can
+    start a fresh budget by sending a new one. It caps well-behaved conversations only. The
+    API key budget is the enforceable limit; every call made on the server's own
+    GEMINI_API_KEY counts against the single "server" entry.
+    """
+
+    def __init__(self, window_seconds: float, session_budget: int, api_key_budget: int, over_budget: str, downgrade_model: str, max_tracked: int):
+        if over_budget not in ("downgrade", "reject"):
+            raise ValueError("over_budget must be 'downgrade' or 'reject'")
+        self.window_seconds = window_seconds
+        self.budgets = {"session": session_budget, "api_key": api_key_budget}
+        self.over_budget = over_budget
+        self.downgrade_model = downgrade_model
+        self._totals = {"session": LRUCache(max_tracked), "api_key": LRUCache(max_tracked)}
+        self._models: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, scope: str, key: str, now: float) -> Dict:
+        entry = self._totals[scope].get(key)
+        if entry is None:
+            entry = {"window_start": now, "window_tokens": 0, "usage": sum_usage([])}
+            self._totals[scope].set(key, entry)
+        elif now - entry["window_start"] >= self.window_seconds:
+            entry["window_start"] = now
+            entry["window_tokens"] = 0
+        return entry
+
+    def admit(self, model: str, session_id: str | None, api_key: str | None) -> str:
+        """Return the model to call, downgraded if a budget is used up, or raise QuotaExceeded"""
+        now = time.monotonic()
+        with self._lock:
+            for scope, key in (("session", session_id), ("api_key", api_key_id(api_key))):
+                budget = self.budgets[scope]
+                if not budget or key is None:
+                    continue
+                entry = self._entry(scope, key, now)
+                if entry["window_tokens"] < budget:
+                    continue
+
+                retry_after = max(1, math.ceil(entry["window_start"] + self.window_seconds - now))
+                if self.over_budget == "reject":
+                    LLM_QUOTA_ACTIONS.inc(scope=scope, action="reject")
+                    raise QuotaExceeded(f"Token budget of {budget} exceeded for this {scope.replace('_', ' ')}", retry_after)
+                if model != self.downgrade_model:
+                    LLM_QUOTA_ACTIONS.inc(scope=scope, action="downgrade")
+                    logger.warning("⬇️ %s %s is over its token budget, using %s instead of %s", scope, key, self.downgrade_model, model)
+                    return self.downgrade_model
+        return model
+
+    def record(self, usage: Dict, session_id: str | None, api_key: str | None):
+        """Add one call's usage (as returned by call_gemini_detailed) to every total it belongs to"""
+        model = usage["model"]
+        LLM_COST_USD.inc(usage["cost_usd"], model=model)
+        now = time.monotonic()
+        with self._lock:
+            self._models[model] = sum_usage([self._models.get(model, sum_usage([])), usage])
+            for scope, key in (("session", session_id), ("api_key", api_key_id(api_key))):
+                if key is None:
+                    continue
+                entry = self._entry(scope, key, now)
+                entry["window_tokens"] += usage["total_tokens"]
+                entry["usage"] = sum_usage([entry["usage"], usage])
+
+    def stats(self, session_id: str | None = None, api_key: str | None = None) -> Dict:
+        with self._lock:
+            stats = {
+                "models": {model: dict(usage) for model, usage in self._models.items()},
+                "budgets": dict(self.budgets),
+                "window_seconds": self.window_seconds,
+                "over_budget": self.over_budget,
+            }
+            for scope, key in (("session", session_id), ("api_key", api_key_id(api_key) if api_key else None)):
+                if key is None:
+                    continue
+                entry = self._totals[scope].get(key)
+                stats[scope] = {
+                    "id": key,
+                    "usage": dict(entry["usage"]) if entry else sum_usage([]),
+                    "window_tokens": entry["window_tokens"] if entry else 0,
+                }
+            return stats
+
+usage_tracker = UsageTracker(
+    window_seconds=settings.USAGE_WINDOW_SECONDS,
+    session_budget=settings.USAGE_SESSION_TOKEN_BUDGET,
+    api_key_budget=settings.USAGE_API_KEY_TOKEN_BUDGET,
+    over_budget=settings.USAGE_OVER_BUDGET,
+    downgrade_model=settings.USAGE_DOWNGRADE_MODEL,
+    max_tracked=settings.USAGE_MAX_TRACKED,
+)
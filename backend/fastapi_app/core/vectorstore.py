@@ -1,71 +1,202 @@
 import chromadb
+import numpy as np
+import threading
+from core.cache import LRUCache
+from core.embeddings import MODEL_EMBEDDING_SPACE, embed_texts, embedding_degraded, embedding_space
+from core.metrics import register_cache
+from core.tracing import span
+from utils.config import settings
 from utils.logger import get_logger
 
 logger = get_logger("vectorstore")
 
 try:
-    client = chromadb.PersistentClient(path="./chroma_db")
+    client = chromadb.PersistentClient(path=settings.CHROMADB_PATH)
     logger.info("✅ ChromaDB client initialized successfully")
 except Exception as e:
-    logger.error(f"❌ Failed to initialize ChromaDB: {e}")
+    logger.error("❌ Failed to initialize ChromaDB: %s", e)
     raise e
 
 try:
     collection = client.get_or_create_collection(name="documents")
     logger.info("✅ ChromaDB collection 'documents' ready")
 except Exception as e:
-    logger.error(f"❌ Failed to get/create collection: {e}")
+    logger.error("❌ Failed to get/create collection: %s", e)
     raise e
 
-def add_document_chunks(doc_id: str, chunks: list[str], embeddings: list[list[float]], metas: list[dict] = None):
-    """Add document chunks to ChromaDB"""
+# Bumped on every index mutation so caches built on retrieval results can tell when they are stale
+_index_generation = 0
+_generation_lock = threading.Lock()
+
+# Retrieval results keyed by (normalized query, n_results, with_embeddings, index generation). Any mutation bumps
+# the generation, so entries from before an ingest or delete can never be served again
+_retrieval_cache = LRUCache(max_entries=settings.RETRIEVAL_CACHE_SIZE, ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS)
+register_cache("retrieval", _retrieval_cache)
+
+# Collection metadata key recording which embedding space the stored vectors belong to
+EMBEDDING_SPACE_KEY = "embedding_space"
+
+class EmbeddingSpaceMismatch(ValueError):
+    """Raised when the active embedder's vectors are not comparable with those already indexed"""
+
+class EmbedderUnavailable(RuntimeError):
+    """Raised on writes while the configured embedding model is not loaded"""
+
+def _check_embedding_space(stamp: bool = False):
+    """Refuse to mix embedding spaces in one collection.
+
+    The first write stamps the collection with the active space; collections indexed before
+    spaces were recorded are assumed to hold sentence-transformer vectors. Writes are refused
+    while the embedder runs degraded, since its fallback vectors are not in the configured space.
+    """
+    if stamp and embedding_degraded():
+        raise EmbedderUnavailable("The embedding model is not loaded, so documents cannot be indexed; check the embedding model and restart")
+    metadata = collection.metadata or {}
+    stored = metadata.get(EMBEDDING_SPACE_KEY)
+    current = embedding_space()
+    if stored is None:
+        stored = MODEL_EMBEDDING_SPACE if collection.count() else current
+        if stamp:
+            # hnsw:* settings cannot be passed to modify(); they stay as created
+            kept = {key: value for key, value in metadata.items() if not key.startswith("hnsw:")}
+            collection.modify(metadata={**kept, EMBEDDING_SPACE_KEY: stored})
+    if stored != current:
+        raise EmbeddingSpaceMismatch(
+            f"The index holds {stored} embeddings but the active embedder produces {current}; "
+            f"set EMBEDDING_BACKEND to match or re-index into a fresh CHROMADB_PATH"
+        )
+
+def get_index_generation() -> int:
+    return _index_generation
+
+def bump_index_generation() -> int:
+    global _index_generation
+    with _generation_lock:
+        _index_generation += 1
+        return _index_generation
+
+def add_document_chunks(doc_id: str, chunks: list[str], embeddings: list[list[float]], metas: list[dict] = None, start_index: int = 0):
+    """Add document chunks to ChromaDB; start_index numbers the ids when a document is added in batches"""
     try:
-        ids = [f"{doc_id}-{i}" for i in range(len(chunks))]
+        ids = [f"{doc_id}-{i}" for i in range(start_index, start_index + len(chunks))]
         metas = metas or [{} for _ in chunks]
         
-        logger.info(f"🔄 Adding {len(chunks)} chunks to ChromaDB for doc {doc_id}")
+        logger.info("🔄 Adding %s chunks to ChromaDB for doc %s", len(chunks), doc_id)
+        _check_embedding_space(stamp=True)
         
-        collection.add(
-            ids=ids,
-            documents=chunks,
-            embeddings=embeddings,
-            metadatas=metas
-        )
+        with span("vector_add"):
+            collection.add(
+                ids=ids,
+                documents=chunks,
+                embeddings=embeddings,
+                metadatas=metas
+            )
         
-        logger.info(f"✅ Successfully added {len(chunks)} chunks to ChromaDB")
+        bump_index_generation()
+        logger.info("✅ Successfully added %s chunks to ChromaDB", len(chunks))
         return True
         
     except Exception as e:
-        logger.error(f"❌ Error adding documents to ChromaDB: {e}")
+        logger.error("❌ Error adding documents to ChromaDB: %s", e)
         return False
 
-def query_similar(query_text: str, n_results: int = 3):
+def get_document_chunk_metas(file_id: str) -> dict[str, dict]:
+    """Metadata of every stored chunk of one document, keyed by chunk id"""
+    result = collection.get(where={"file_id": file_id}, include=["metadatas"])
+    return dict(zip(result["ids"], result["metadatas"] or [{} for _ in result["ids"]]))
+
+def get_chunk_embeddings(ids: list[str]) -> dict[str, list[float]]:
+    if not ids:
+        return {}
+    result = collection.get(ids=ids, include=["embeddings"])
+    return dict(zip(result["ids"], result["embeddings"]))
+
+def upsert_document_chunks(ids: list[str], chunks: list[str], embeddings: list[list[float]], metas: list[dict]):
+    """Insert or overwrite chunks by id"""
+    _check_embedding_space(stamp=True)
+    with span("vector_upsert"):
+        collection.upsert(ids=ids, documents=chunks, embeddings=embeddings, metadatas=metas)
+    bump_index_generation()
+    logger.debug("🔄 Upserted %s chunks", len(ids))
+
+def update_chunk_metadata(ids: list[str], metas: list[dict]):
+    """Rewrite chunk metadata without touching text or embeddings"""
+    collection.update(ids=ids, metadatas=metas)
+    bump_index_generation()
+
+def delete_chunks(ids: list[str]):
+    if not ids:
+        return
+    collection.delete(ids=ids)
+    bump_index_generation()
+
+def delete_document_chunks(file_id: str) -> int:
+    """Remove every chunk of one document and return how many were removed"""
+    ids = collection.get(where={"file_id": file_id}, include=[])["ids"]
+    if ids:
+        with span("vector_delete"):
+            collection.delete(ids=ids)
+        bump_index_generation()
+        logger.info("🗑️ Removed %s chunks for doc %s", len(ids), file_id)
+    return len(ids)
+
+def query_similar(query_text: str, n_results: int = 3, with_embeddings: bool = False):
     """Query similar documents from ChromaDB"""
+    logger.debug("🔍 Querying ChromaDB for: %.200s", query_text)
+    return query_similar_batch([query_text], n_results=n_results, with_embeddings=with_embeddings)[0]
+
+def query_similar_batch(query_texts: list[str], n_results: int = 3, with_embeddings: bool = False) -> list[list[dict]]:
+    """Query similar documents for many queries with one embedding pass and one ChromaDB call.
+
+    Queries answered since the last index mutation are served from the retrieval cache and
+    skip both the embedding and the vector search. with_embeddings adds each chunk's stored
+    embedding (as a float32 array) under "embedding", for re-ranking such as MMR.
+    """
+    if not query_texts:
+        return []
+    
+    generation = get_index_generation()
+    keys = [(" ".join(text.lower().split()), n_results, with_embeddings, generation) for text in query_texts]
+    batch_results = [_retrieval_cache.get(key) for key in keys]
+    misses = [q for q, cached in enumerate(batch_results) if cached is None]
+    if not misses:
+        logger.debug("✅ Retrieval cache hit for %s queries", len(query_texts))
+        return [list(cached) for cached in batch_results]
+    
     try:
-        logger.info(f"🔍 Querying ChromaDB for: {query_text}")
+        _check_embedding_space()
+        query_embeddings = embed_texts([query_texts[q] for q in misses])
         
-        results = collection.query(
-            query_texts=[query_text],
-            n_results=n_results,
-            include=["documents", "metadatas", "distances"]
-        )
+        with span("vector_query"):
+            results = collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"] + (["embeddings"] if with_embeddings else [])
+            )
         
-        formatted_results = []
-        if results["documents"] and results["documents"][0]:
-            for i in range(len(results["documents"][0])):
+        for m, q in enumerate(misses):
+            formatted_results = []
+            documents = results["documents"][m] if results["documents"] else []
+            for i in range(len(documents)):
                 formatted_results.append({
-                    "id": results["ids"][0][i] if results["ids"] else f"doc-{i}",
-                    "text": results["documents"][0][i],
-                    "meta": results["metadatas"][0][i] if results["metadatas"] else {},
-                    "distance": results["distances"][0][i] if results["distances"] else 0.0
+                    "id": results["ids"][m][i] if results["ids"] else f"doc-{i}",
+                    "text": documents[i],
+                    "meta": results["metadatas"][m][i] if results["metadatas"] else {},
+                    "distance": results["distances"][m][i] if results["distances"] else 0.0
                 })
+                if with_embeddings:
+                    formatted_results[-1]["embedding"] = np.asarray(results["embeddings"][m][i], dtype=np.float32)
+            # Stored under the generation read before querying, so a concurrent ingest only
+            # makes this entry unreachable rather than stale
+            _retrieval_cache.set(keys[q], formatted_results)
+            batch_results[q] = formatted_results
         
-        logger.info(f"✅ Found {len(formatted_results)} similar documents")
-        return formatted_results
+        logger.debug("✅ Found similar documents for %s queries (%s cached)", len(query_texts), len(query_texts) - len(misses))
+        return [list(cached) for cached in batch_results]
         
     except Exception as e:
-        logger.error(f"❌ Error querying ChromaDB: {e}")
-        return []
+        logger.error("❌ Error querying ChromaDB: %s", e)
+        return [[] for _ in query_texts]
 
 def reset_collection():
     """Reset the collection (for testing)"""
@@ -73,8 +204,9 @@ def reset_collection():
         client.delete_collection(name="documents")
         global collection
         collection = client.create_collection(name="documents")
+        bump_index_generation()
         logger.info("✅ ChromaDB collection reset successfully")
         return True
     except Exception as e:
-        logger.error(f"❌ Error resetting collection: {e}")
+        logger.error("❌ Error resetting collection: %s", e)
         return False
\ No newline at end of file
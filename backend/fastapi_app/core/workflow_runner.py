@@ -1,13 +1,27 @@
 from utils.logger import get_logger
-from core.vectorstore import query_similar
-from core.llm_engine import call_gemini
+from utils.config import settings
+from core.cache import LRUCache
+from core.vectorstore import query_similar, get_index_generation
+from core.llm_engine import call_gemini_detailed, web_search, format_web_results
+from core.run_context import RunContext, RunCancelled, DeadlineExceeded
+from core.metrics import registry, register_cache
+from core.tracing import Trace, activate, bind, current_trace, span
+from core.usage import QuotaExceeded, sum_usage, usage_tracker
+from core.model_router import model_router, validate_model
+from core.context_assembler import assemble_context
+from core.profiler import profile_store
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, Any, List
 import datetime
-import requests
-import os
+import hashlib
+import json
+import time
 
 logger = get_logger("workflow_runner")
 
+KNOWLEDGE_BASE_RESULTS = 3
+LLM_ERROR_PREFIX = "Error calling LLM"
+
 class ConversationMemory:
     def __init__(self, max_history: int = 10):
         self.max_history = max_history
@@ -43,11 +57,93 @@ class ConversationMemory:
 
 conversation_memory = ConversationMemory()
 
+# Memoized node outputs keyed by node type + config + input hash, shared across runs
+node_cache = LRUCache(max_entries=settings.NODE_CACHE_SIZE, ttl_seconds=settings.NODE_CACHE_TTL_SECONDS)
+CACHEABLE_NODE_TYPES = {"knowledgeBase", "llm"}
+register_cache("node", node_cache)
+
+# Built executors for saved workflows, keyed by (workflow_id, version); version None means latest
+executor_cache = LRUCache(max_entries=settings.WORKFLOW_CACHE_SIZE, ttl_seconds=settings.WORKFLOW_CACHE_TTL_SECONDS)
+register_cache("workflow", executor_cache)
+
+WORKFLOW_RUN_SECONDS = registry.histogram("workflow_run_seconds", "End-to-end workflow run latency by outcome")
+WORKFLOW_NODE_SECONDS = registry.histogram("workflow_node_seconds", "Per-node latency by node type and cache use")
+# Node types come from client JSON, so any other type is labelled "other" to bound metric series
+METRIC_NODE_TYPES = {"userQuery", "knowledgeBase", "llm", "output"}
+
+# Nodes run here when a deadline applies so the run can give up on them without waiting
+_node_pool = ThreadPoolExecutor(max_workers=settings.NODE_WORKER_THREADS, thread_name_prefix="workflow-node")
+# Separate pool so nodes waiting on a search can never starve the searches themselves
+_web_search_pool = ThreadPoolExecutor(max_workers=settings.WEB_SEARCH_POOL_SIZE, thread_name_prefix="web-search")
+
+def _node_timeout(node: Dict) -> float | None:
+    """Per-node timeout in seconds from the node config's timeoutSeconds, if set"""
+    timeout = node.get("data", {}).get("config", {}).get("timeoutSeconds")
+    if timeout in (None, ""):
+        return None
+    try:
+        timeout = float(timeout)
+    except (TypeError, ValueError):
+        raise ValueError(f"Node {node.get('id')} has an invalid timeoutSeconds: {timeout!r}")
+    if timeout <= 0:
+        raise ValueError(f"Node {node.get('id')} timeoutSeconds must be positive")
+    return timeout
+
+def _web_search_results(node: Dict) -> int:
+    """Number of SerpAPI results from the node config's webSearchResults, else WEB_SEARCH_MAX_RESULTS"""
+    max_results = node.get("data", {}).get("config", {}).get("webSearchResults")
+    if max_results in (None, ""):
+        return settings.WEB_SEARCH_MAX_RESULTS
+    try:
+        max_results = int(max_results)
+    except (TypeError, ValueError):
+        raise ValueError(f"Node {node.get('id')} has an invalid webSearchResults: {max_results!r}")
+    if max_results <= 0:
+        raise ValueError(f"Node {node.get('id')} webSearchResults must be positive")
+    return max_results
+
+def _knowledge_base_options(node: Dict) -> Dict[str, Any]:
+    """Retrieval and context assembly options from a knowledgeBase node's topK, contextBudget and mmrLambda"""
+    node_config = node.get("data", {}).get("config", {})
+    try:
+        top_k = int(node_config.get("topK") or KNOWLEDGE_BASE_RESULTS)
+        budget_chars = int(node_config.get("contextBudget") or settings.CONTEXT_BUDGET_CHARS)
+        mmr_lambda = float(node_config.get("mmrLambda", settings.CONTEXT_MMR_LAMBDA))
+    except (TypeError, ValueError):
+        raise ValueError(f"Node {node.get('id')} has an invalid topK, contextBudget or mmrLambda")
+    if top_k <= 0 or budget_chars <= 0 or not 0.0 <= mmr_lambda <= 1.0:
+        raise ValueError(f"Node {node.get('id')} needs topK > 0, contextBudget > 0 and 0 <= mmrLambda <= 1")
+    return {
+        "top_k": top_k,
+        "fetch_k": top_k * max(1, settings.CONTEXT_FETCH_MULTIPLIER),
+        "budget_chars": budget_chars,
+        "mmr_lambda": mmr_lambda,
+    }
+
+def _latency_slo_ms(node: Dict) -> float | None:
+    """Routing SLO in milliseconds from the node config's latencySloMs, else ROUTER_DEFAULT_SLO_MS"""
+    slo_ms = node.get("data", {}).get("config", {}).get("latencySloMs")
+    if slo_ms in (None, ""):
+        return settings.ROUTER_DEFAULT_SLO_MS
+    try:
+        slo_ms = float(slo_ms)
+    except (TypeError, ValueError):
+        raise ValueError(f"Node {node.get('id')} has an invalid latencySloMs: {slo_ms!r}")
+    if slo_ms <= 0:
+        raise ValueError(f"Node {node.get('id')} has an invalid latencySloMs: {slo_ms!r}")
+    return slo_ms
+
+def _conversation_context(session_id: str | None) -> str:
+    if session_id is None:
+        return "No previous conversation context."
+    return conversation_memory.get_context_summary(session_id)
+
 class WorkflowExecutor:
     def __init__(self):
         self.nodes = []
         self.connections = []
-        self.node_results = {}  
+        self._nodes_by_id = {}
+        self._next_node = {}
     
     def build_workflow(self, nodes: List[Dict], edges: List[Dict]):
         """Build and validate workflow structure"""
@@ -62,20 +158,100 @@ class WorkflowExecutor:
         if not has_output:
             raise ValueError("Workflow must contain an Output component")
         
-        logger.info(f"✅ Workflow built with {len(nodes)} nodes and {len(edges)} connections")
+        for node in nodes:
+            _node_timeout(node)
+            if node.get("type") == "llm":
+                node_config = node.get("data", {}).get("config", {})
+                try:
+                    validate_model(node_config.get("model", "gemini-2.5-flash"))
+                except ValueError as e:
+                    raise ValueError(f"Node {node.get('id')}: {e}")
+                _latency_slo_ms(node)
+                _web_search_results(node)
+            elif node.get("type") == "knowledgeBase":
+                _knowledge_base_options(node)
+        
+        # Index nodes and connections once so a built executor can be reused across runs
+        self._nodes_by_id = {node["id"]: node for node in nodes if "id" in node}
+        self._next_node = {}
+        for connection in edges:
+            source = connection.get("source")
+            if source is not None and source not in self._next_node:
+                self._next_node[source] = connection.get("target")
+        
+        logger.info("✅ Workflow built with %s nodes and %s connections", len(nodes), len(edges))
         return True
     
-    def execute_workflow(self, query: str, session_id: str = "default") -> Dict[str, Any]:
-        """Execute the workflow with the given query and return results with node outputs"""
-        logger.info(f"🚀 Starting workflow execution with query: {query}")
+    def has_node_type(self, node_type: str) -> bool:
+        return any(node.get("type") == node_type for node in self.nodes)
+    
+    def retrieval_size(self) -> int | None:
+        """Candidates the knowledgeBase node retrieves, for callers that prefetch on its behalf"""
+        node = next((node for node in self.nodes if node.get("type") == "knowledgeBase"), None)
+        return _knowledge_base_options(node)["fetch_k"] if node else None
+    
+    def execute_workflow(self, query: str, session_id: str | None = "default", prefetched_docs: List[Dict] | None = None, use_cache: bool = True, run_context: RunContext | None = None) -> Dict[str, Any]:
+        """Execute the workflow with the given query and return results with node outputs.
 
-        conversation_memory.add_message(session_id, "user", query)
+        Passing session_id=None runs without conversation memory. prefetched_docs lets
+        callers that already retrieved context (e.g. batch runs) skip the knowledge base query.
+        With use_cache, nodes whose type, config and inputs are unchanged since an earlier run
+        reuse the memoized output instead of being re-executed; LLM nodes are keyed on the
+        conversation history from before this run's query, which with the query determines the
+        prompt, so a session only hits when its earlier turns match. run_context carries the run
+        deadline and cancellation, which are checked before every node. Web searches for LLM
+        nodes with useWebSearch start immediately, in parallel with knowledge base retrieval,
+        unless the node's result is already memoized.
+        """
+        logger.info("🚀 Starting workflow execution")
+        logger.debug("Workflow query: %.200s", query)
 
-        logger.info(f"📋 Available nodes: {[node.get('type') for node in self.nodes]}")
-        logger.info(f"🔗 Available connections: {len(self.connections)}")
+        # Snapshot before this turn is added so concurrent turns in the session cannot change node cache keys mid-run
+        conversation = _conversation_context(session_id)
+        if session_id is not None:
+            conversation_memory.add_message(session_id, "user", query)
+
+        logger.debug("📋 %s nodes, 🔗 %s connections", len(self.nodes), len(self.connections))
+        
+        node_results = {}
+        
+        trace = Trace()
+        web_searches = self._start_web_searches(query, conversation, use_cache, run_context, trace)
+        status = "error"
+        try:
+            current_data = self._run_nodes(query, session_id, conversation, prefetched_docs, use_cache, run_context, web_searches, trace, node_results)
+            status = "success"
+        except DeadlineExceeded:
+            status = "timeout"
+            raise
+        except RunCancelled:
+            status = "cancelled"
+            raise
+        finally:
+            WORKFLOW_RUN_SECONDS.observe(time.perf_counter() - trace.started_at, status=status)
+            profile_store.capture_slow_run("workflow_run", f"session {session_id}", trace, {
+                "status": status,
+                "query": query[:200],
+                "nodes": {node_id: result.get("timings", {}) for node_id, result in node_results.items()},
+            })
+        
+        final_output = current_data.get("output", "No output generated")
+        
+        if session_id is not None:
+            conversation_memory.add_message(session_id, "assistant", final_output)
         
-        self.node_results = {}
+        logger.info("🎉 Workflow execution completed successfully")
         
+        return {
+            "final_output": final_output,
+            "node_results": node_results,
+            "timings": {"total_ms": trace.elapsed_ms()},
+            # Memoized nodes made no LLM call in this run, so their usage is not counted again
+            "usage": sum_usage(result["usage"] for result in node_results.values() if result.get("usage") and not result["cached"])
+        }
+    
+    def _run_nodes(self, query: str, session_id: str | None, conversation: str, prefetched_docs: List[Dict] | None, use_cache: bool, run_context: RunContext | None, web_searches: Dict[str, Future], trace: Trace, node_results: Dict) -> Dict:
+        """Walk the node chain from the User Query node, filling node_results, and return the last node's data"""
         user_query_node = next((node for node in self.nodes if node.get("type") == "userQuery"), None)
         if not user_query_node:
             raise ValueError("No User Query node found in workflow")
@@ -87,38 +263,126 @@ class WorkflowExecutor:
         
         while current_node_id and current_node_id not in visited_nodes:
             visited_nodes.add(current_node_id)
-            current_node = next((node for node in self.nodes if node["id"] == current_node_id), None)
+            current_node = self._nodes_by_id.get(current_node_id)
             
             if not current_node:
                 break
+            
+            if run_context is not None:
+                run_context.check()
+            
+            node_started_at = time.perf_counter()
+            with activate(trace, current_node_id):
+                cache_key = self._node_cache_key(current_node, current_data, conversation) if use_cache else None
+                cached_data = node_cache.get(cache_key) if cache_key else None
                 
-            current_data = self._process_node(current_node, current_data, session_id)
+                if cached_data is not None:
+                    logger.info("♻️ Reusing memoized result for node %s (%s)", current_node_id, current_node.get('type'))
+                    current_data = cached_data
+                else:
+                    web_search_future = web_searches.get(current_node_id) or self._start_web_search(current_node, query, run_context, trace)
+                    current_data = self._run_node(current_node, current_data, session_id, prefetched_docs, run_context, web_search_future)
+                    if cache_key and self._is_cacheable_result(current_node, current_data):
+                        node_cache.set(cache_key, current_data)
             
-            self._store_node_result(current_node, current_data)
+            node_seconds = time.perf_counter() - node_started_at
+            node_type = current_node.get("type")
+            WORKFLOW_NODE_SECONDS.observe(node_seconds, node_type=node_type if node_type in METRIC_NODE_TYPES else "other", cached=str(cached_data is not None).lower())
+            timings = trace.node_timings(current_node_id)
+            timings["total_ms"] = round(node_seconds * 1000, 2)
+            
+            self._store_node_result(node_results, current_node, current_data, cached=cached_data is not None, input_hash=cache_key, timings=timings)
             
             next_node_id = self._get_next_node(current_node_id)
             current_node_id = next_node_id
         
-        final_output = current_data.get("output", "No output generated")
-        
-        conversation_memory.add_message(session_id, "assistant", final_output)
+        return current_data
+    
+    def _start_web_searches(self, query: str, conversation: str, use_cache: bool, run_context: RunContext | None, trace: Trace) -> Dict[str, Future]:
+        """Kick off SerpAPI lookups for every LLM node that uses web search and is not memoized"""
+        memoized = self._memoized_nodes(query, conversation) if use_cache else set()
+        searches = {}
+        for node in self.nodes:
+            if node.get("id") in memoized:
+                continue
+            search = self._start_web_search(node, query, run_context, trace)
+            if search is not None:
+                searches[node["id"]] = search
+        return searches
+    
+    def _start_web_search(self, node: Dict, query: str, run_context: RunContext | None, trace: Trace) -> Future | None:
+        node_config = node.get("data", {}).get("config", {})
+        if node.get("type") != "llm" or not node_config.get("useWebSearch"):
+            return None
+        serp_api_key = node_config.get("serpApiKey") or settings.SERPAPI_KEY
+        if not serp_api_key:
+            return None
+        return _web_search_pool.submit(bind(web_search, trace, node["id"]), query, serp_api_key, run_context, _web_search_results(node))
+    
+    def _memoized_nodes(self, query: str, conversation: str) -> set:
+        """Ids of the nodes a run would serve from node_cache, found by following the chain through
+        cached results without executing anything. Stops at the first node that would execute,
+        since later inputs are unknown until it has run."""
+        memoized = set()
+        data = {"query": query, "output": query}
+        node_id = next((node["id"] for node in self.nodes if node.get("type") == "userQuery"), None)
+        visited = set()
+        while node_id and node_id not in visited:
+            visited.add(node_id)
+            node = self._nodes_by_id.get(node_id)
+            if node is None:
+                break
+            if node.get("type") != "userQuery":
+                cache_key = self._node_cache_key(node, data, conversation)
+                data = node_cache.peek(cache_key) if cache_key else None
+                if data is None:
+                    break
+                memoized.add(node_id)
+            node_id = self._get_next_node(node_id)
+        return memoized
+    
+    def _node_cache_key(self, node: Dict, data: Dict, conversation: str) -> str | None:
+        """Hash everything a cacheable node's output depends on; None for nodes that are not memoized.
+
+        conversation is the session history preceding the run. The prompt's history also shows
+        the current query, but that is already keyed as the query input.
+        """
+        node_type = node.get("type")
+        if node_type not in CACHEABLE_NODE_TYPES:
+            return None
         
-        logger.info(f"🎉 Workflow execution completed successfully")
+        node_config = node.get("data", {}).get("config", {})
+        if node_type == "knowledgeBase":
+            inputs = {"query": data.get("query", ""), "index_generation": get_index_generation()}
+        else:
+            inputs = {
+                "query": data.get("query", ""),
+                "context": data.get("context", ""),
+                "conversation": conversation,
+            }
         
-        return {
-            "final_output": final_output,
-            "node_results": self.node_results
-        }
+        payload = json.dumps([node_type, node_config, inputs], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _is_cacheable_result(self, node: Dict, data: Dict) -> bool:
+        if node.get("type") == "llm":
+            return not str(data.get("output", "")).startswith(LLM_ERROR_PREFIX)
+        return True
     
-    def _store_node_result(self, node: Dict, data: Dict):
+    def _store_node_result(self, node_results: Dict, node: Dict, data: Dict, cached: bool = False, input_hash: str | None = None, timings: Dict | None = None):
         """Store the result of node processing for frontend display"""
         node_id = node["id"]
         node_type = node.get("type")
         
         result_data = {
             "type": node_type,
-            "timestamp": datetime.datetime.now().isoformat()
+            "timestamp": datetime.datetime.now().isoformat(),
+            "cached": cached
         }
+        if input_hash:
+            result_data["input_hash"] = input_hash
+        if timings is not None:
+            result_data["timings"] = timings
         
         if node_type == "userQuery":
             result_data["data"] = data.get("query", "")
@@ -126,19 +390,40 @@ class WorkflowExecutor:
             result_data["data"] = data.get("context", "")
         elif node_type == "llm":
             result_data["data"] = data.get("output", "")
+            result_data["model"] = data.get("model")
+            result_data["usage"] = data.get("usage")
+            result_data["routing"] = data.get("routing")
         elif node_type == "output":
             result_data["data"] = data.get("output", "")
         else:
             result_data["data"] = data.get("output", data.get("query", ""))
         
-        self.node_results[node_id] = result_data
-        logger.debug(f"📊 Stored result for node {node_id} ({node_type}): {len(str(result_data['data']))} chars")
+        node_results[node_id] = result_data
+        logger.debug("📊 Stored result for node %s (%s): %s chars", node_id, node_type, len(str(result_data['data'])))
+    
+    def _run_node(self, node: Dict, data: Dict, session_id: str | None, prefetched_docs: List[Dict] | None, run_context: RunContext | None, web_search_future: Future | None = None) -> Dict:
+        """Process a node, enforcing its timeoutSeconds and the run deadline when either applies"""
+        node_timeout = _node_timeout(node)
+        if run_context is None and node_timeout is None:
+            return self._process_node(node, data, session_id, prefetched_docs, web_search_future=web_search_future)
+        
+        context = run_context or RunContext()
+        process_node = bind(self._process_node, current_trace(), node.get("id"))
+        future = _node_pool.submit(process_node, node, data, session_id, prefetched_docs, context, web_search_future)
+        try:
+            return context.wait(future, node_timeout, label=f"Node {node.get('id')} ({node.get('type')})")
+        except (DeadlineExceeded, RunCancelled) as e:
+            # Once the run itself is over, tell abandoned nodes not to start further work such as
+            # LLM fallbacks. A node's own timeout fails the run but is not a cancellation
+            if isinstance(e, RunCancelled) or context.remaining() == 0:
+                context.cancel()
+            raise
     
-    def _process_node(self, node: Dict, data: Dict, session_id: str = "default") -> Dict:
+    def _process_node(self, node: Dict, data: Dict, session_id: str | None = "default", prefetched_docs: List[Dict] | None = None, run_context: RunContext | None = None, web_search_future: Future | None = None) -> Dict:
         node_type = node.get("type")
         node_config = node.get("data", {}).get("config", {})
         
-        logger.info(f"🔄 Processing node: {node_type}")
+        logger.debug("🔄 Processing node: %s", node_type)
         
         if node_type == "userQuery":
             query_text = data.get("query", "")
@@ -147,10 +432,15 @@ class WorkflowExecutor:
         elif node_type == "knowledgeBase":
             query = data.get("query", "")
             if query:
-                logger.info(f"🔍 Querying knowledge base for: {query}")
-                similar_docs = query_similar(query, n_results=3)
-                context = "\n\n".join([doc["text"] for doc in similar_docs]) if similar_docs else ""
-                logger.info(f"📚 Retrieved {len(similar_docs)} relevant chunks from knowledge base")
+                options = _knowledge_base_options(node)
+                if prefetched_docs is not None:
+                    similar_docs = prefetched_docs
+                else:
+                    logger.debug("🔍 Querying knowledge base for: %.200s", query)
+                    similar_docs = query_similar(query, n_results=options["fetch_k"], with_embeddings=True)
+                with span("context_assembly"):
+                    context = assemble_context(similar_docs, options["top_k"], options["budget_chars"], options["mmr_lambda"]) if similar_docs else ""
+                logger.info("📚 Retrieved %s candidate chunks, assembled %s characters of context", len(similar_docs), len(context))
                 return {
                     "query": query, 
                     "context": context, 
@@ -162,8 +452,8 @@ class WorkflowExecutor:
             query = data.get("query", "")
             context = data.get("context", "")
             
-            logger.info(f"🤖 Calling LLM with query: {query[:100]}...")
-            logger.info(f"📖 Context length: {len(context)} characters")
+            logger.debug("🤖 Calling LLM with query: %.100s", query)
+            logger.debug("📖 Context length: %s characters", len(context))
             
             node_data = node.get("data", {})
             node_config = node_data.get("config", {})
@@ -174,17 +464,26 @@ class WorkflowExecutor:
             use_websearch = node_config.get("useWebSearch", False)
             serp_api_key = node_config.get("serpApiKey", "")
             
-            logger.info(f"🔧 LLM Config - Model: {model}, WebSearch: {use_websearch}")
+            logger.debug("🔧 LLM Config - Model: %s, WebSearch: %s", model, use_websearch)
             
-            conversation_context = conversation_memory.get_context_summary(session_id)
+            web_section = ""
+            if use_websearch:
+                with span("web_search_wait"):
+                    web_results = self._collect_web_results(web_search_future, serp_api_key, run_context)
+                web_section = f"""
+
+        WEB SEARCH RESULTS:
+        {web_results}"""
             
-            prompt = f"""You are an expert AI assistant with access to document context and optional web search.
+            with span("prompt_assembly"):
+                conversation_context = _conversation_context(session_id)
+                prompt = f"""You are an expert AI assistant with access to document context and optional web search.
 
         CONVERSATION HISTORY:
         {conversation_context}
 
         DOCUMENT CONTEXT:
-        {context if context else "No specific context available from uploaded documents."}
+        {context if context else "No specific context available from uploaded documents."}{web_section}
 
         USER QUESTION:
         {query}
@@ -199,61 +498,77 @@ class WorkflowExecutor:
 
         Please provide a well-structured, informative response:"""
             
-            logger.info(f"🚀 Calling Gemini model: {model}")
+            logger.debug("🚀 Calling Gemini model: %s", model)
             
+            usage = None
+            routing = None
             try:
-                response = call_gemini(
+                routing = model_router.route(model, prompt, _latency_slo_ms(node))
+                model = usage_tracker.admit(routing["model"], session_id, api_key)
+                if model != routing["model"]:
+                    routing.update(model=model, reason="over_budget")
+                result = call_gemini_detailed(
                     prompt=prompt,
                     model=model,
                     temperature=temperature,
-                    api_key=api_key
+                    api_key=api_key,
+                    run_context=run_context
                 )
+                response, model, usage = result["text"], result["model"], result["usage"]
+                if usage is not None:
+                    usage_tracker.record(usage, session_id, api_key)
                 
-                logger.info(f"✅ LLM response received: {len(response)} characters")
-                logger.info(f"🌐 Web search would be used: {use_websearch}")
+                logger.info("✅ LLM response received: %s characters", len(response))
                 
+            except (DeadlineExceeded, RunCancelled, QuotaExceeded):
+                raise
             except Exception as e:
-                logger.error(f"❌ LLM call failed: {str(e)}")
-                response = f"Error calling LLM: {str(e)}"
+                logger.error("❌ LLM call failed: %s", e)
+                response = f"{LLM_ERROR_PREFIX}: {str(e)}"
             
             return {
                 "query": query,
                 "context": context,
-                "output": response
+                "output": response,
+                "model": model,
+                "usage": usage,
+                "routing": routing
             }
             
         elif node_type == "output":
             output = data.get("output", "No output generated")
-            logger.info(f"📤 Final output ready: {output[:200]}...")
+            logger.debug("📤 Final output ready: %.200s", output)
             return {"output": output}
         
         return data
     
+    def _collect_web_results(self, web_search_future: Future | None, serp_api_key: str, run_context: RunContext | None) -> str:
+        """Wait for the web search started at the beginning of the run and format its results"""
+        if web_search_future is None:
+            if not (serp_api_key or settings.SERPAPI_KEY):
+                logger.warning("Web search enabled but no SerpAPI key provided")
+                return "Web search was enabled but no SerpAPI key was provided."
+            return "No web search results available."
+        
+        try:
+            results = (run_context or RunContext()).wait(web_search_future, settings.WEB_SEARCH_TIMEOUT_SECONDS, label="Web search")
+        except RunCancelled:
+            raise
+        except DeadlineExceeded as e:
+            if run_context is not None and run_context.remaining() == 0:
+                raise
+            logger.warning("🌐 %s, continuing without web results", e)
+            results = []
+        
+        logger.info("🌐 Using %s web search results", len(results))
+        return format_web_results(results) if results else "Web search returned no relevant results."
+    
     def _get_next_node(self, current_node_id: str) -> str:
         """Find the next node in the workflow based on connections"""
-        for connection in self.connections:
-            if connection.get("source") == current_node_id:
-                return connection.get("target")
-        return None
+        return self._next_node.get(current_node_id)
 
-def execute_workflow(workflow: dict, query: str, session_id: str = "default") -> Dict[str, Any]:
-    """
-    Main workflow execution function - returns both final output and node results
-    """
-    try:
-        executor = WorkflowExecutor()
-        
-        nodes = workflow.get("nodes", [])
-        edges = workflow.get("edges", [])
-        
-        logger.info(f"🏗️ Starting workflow execution with {len(nodes)} nodes and {len(edges)} edges")
-        
-        executor.build_workflow(nodes, edges)
-        
-        result = executor.execute_workflow(query, session_id)
-        
-        return result
-        
-    except Exception as e:
-        logger.error(f"❌ Workflow execution failed: {str(e)}")
-        raise e
\ No newline at end of file
+def build_executor(workflow: dict) -> WorkflowExecutor:
+    """Build a reusable executor for a workflow definition"""
+    executor = WorkflowExecutor()
+    executor.build_workflow(workflow.get("nodes", []), workflow.get("edges", []))
+    return executor
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from sqlalchemy import insert
+from core.metrics import registry
+from db.database import AsyncSessionLocal
+from db.models import ChatLog
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger("chat_log_writer")
+
+CHAT_LOGS_WRITTEN = registry.counter("chat_logs_written_total", "Workflow run records persisted to chat_logs")
+CHAT_LOGS_DROPPED = registry.counter("chat_logs_dropped_total", "Workflow run records dropped, by reason")
+CHAT_LOG_FLUSH_SECONDS = registry.histogram("chat_log_flush_seconds", "Time to bulk insert one batch of chat_logs rows")
+
+class ChatLogWriter:
+    """Buffers run records in memory and bulk inserts them into chat_logs from a background task.
+
+    record() never touches the database, so request handlers pay no DB round trip. Records are
+    flushed every CHAT_LOG_FLUSH_INTERVAL_SECONDS or once CHAT_LOG_BATCH_SIZE are pending. If the
+    buffer is full or a flush fails, records are dropped and counted rather than blocking requests.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_queue: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+    
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+            logger.info("📝 Chat log writer started")
+    
+    async def stop(self):
+        """Stop the background task after flushing whatever is still buffered"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while rows := self._drain():
+            await self._flush(rows)
+    
+    def record(self, query: str, response: str | None, latency_ms: float, status: str = "success", session_id: str | None = None, workflow_id: int | None = None, node_timings: dict | None = None):
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait({
+                "query": query,
+                "response": response,
+                "latency_ms": latency_ms,
+                "status": status,
+                "session_id": session_id,
+                "workflow_id": workflow_id,
+                "node_timings": node_timings,
+            })
+        except asyncio.QueueFull:
+            CHAT_LOGS_DROPPED.inc(reason="queue_full")
+    
+    def _drain(self) -> list:
+        rows = []
+        while self._queue is not None and not self._queue.empty() and len(rows) < self.batch_size:
+            rows.append(self._queue.get_nowait())
+        return rows
+    
+    async def _run(self):
+        while True:
+            rows = [await self._queue.get()]
+            flush_at = time.monotonic() + self.flush_interval
+            try:
+                while len(rows) < self.batch_size:
+                    timeout = flush_at - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        rows.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            finally:
+                # Rows already taken off the queue are flushed even when stop() cancels us
+                await self._flush(rows)
+    
+    async def _flush(self, rows: list):
+        if not rows:
+            return
+        started_at = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(ChatLog), rows)
+                await db.commit()
+            CHAT_LOGS_WRITTEN.inc(len(rows))
+        except Exception as e:
+            CHAT_LOGS_DROPPED.inc(len(rows), reason="flush_error")
+            logger.error("❌ Failed to write %s chat log rows: %s", len(rows), e)
+        finally:
+            CHAT_LOG_FLUSH_SECONDS.observe(time.perf_counter() - started_at)
+
+def node_timings(node_results: dict) -> dict:
+    """Pull the per-node timings out of a run's node_results"""
+    return {node_id: result.get("timings", {}) for node_id, result in node_results.items()}
+
+chat_log_writer = ChatLogWriter(
+    batch_size=settings.CHAT_LOG_BATCH_SIZE,
+    flush_interval=settings.CHAT_LOG_FLUSH_INTERVAL_SECONDS,
+    max_queue=settings.CHAT_LOG_QUEUE_SIZE,
+)
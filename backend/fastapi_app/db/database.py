@@ -1,11 +1,42 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 from utils.config import settings
 from utils.logger import get_logger
 
 logger = get_logger("database")
-engine = create_engine(settings.DATABASE_URL, echo=False, future=True)
+
+def _sync_url(url: str) -> str:
+    # Hosted Postgres providers often hand out postgres:// URLs, which SQLAlchemy 2 rejects
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+def _async_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto the matching asyncio driver"""
+    url = _sync_url(url)
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
+
+def _pool_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": True,
+    }
+
+engine = create_engine(_sync_url(settings.DATABASE_URL), echo=False, future=True, **_pool_options(settings.DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine(_async_url(settings.DATABASE_URL), echo=False, **_pool_options(settings.DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -14,3 +45,55 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def create_tables():
+    """Create missing tables, then bring tables created by older releases up to date"""
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_add_missing_indexes)
+        await conn.run_sync(_backfill)
+
+def _add_missing_columns(conn):
+    """create_all never alters an existing table, so add the columns models gained since.
+
+    Columns are added nullable and without server defaults, which SQLite cannot add to an
+    existing table; _backfill fills in values the application relies on. Idempotent.
+    """
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+            logger.info("🛠️ Added column %s.%s", table.name, column.name)
+
+def _add_missing_indexes(conn):
+    """create_all also skips the indexes of existing tables, e.g. the unique documents.file_id"""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                logger.info("🛠️ Created index %s", index.name)
+
+def _backfill(conn):
+    """Give rows written before versioning a version number and a version 1 snapshot"""
+    conn.execute(text("UPDATE workflows SET version = 1 WHERE version IS NULL"))
+    conn.execute(text(
+        "INSERT INTO workflow_versions (workflow_id, version, structure, created_at) "
+        "SELECT w.id, w.version, w.structure, w.created_at FROM workflows w "
+        "WHERE NOT EXISTS (SELECT 1 FROM workflow_versions v WHERE v.workflow_id = w.id)"
+    ))
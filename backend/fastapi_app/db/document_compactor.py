@@ -0,0 +1,95 @@
+import asyncio
+import os
+import time
+from sqlalchemy import select
+from core.metrics import registry
+from core.vectorstore import delete_document_chunks
+from db.database import AsyncSessionLocal
+from db.models import Document
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger("document_compactor")
+
+DOCUMENTS_COMPACTED = registry.counter("documents_compacted_total", "Orphaned chunks, files and staging files removed by compaction")
+
+STAGING_PREFIX = ".staging-"
+
+class DocumentCompactor:
+    """Periodically removes what interrupted uploads leave behind.
+
+    - uploads whose Document row is still "pending": their chunks, uploaded file and row
+    - abandoned replace staging files
+
+    Only state this code creates is touched: chunks or files without a Document row, such as
+    those indexed before documents had rows, are never removed. A pending upload is only
+    compacted once this process has seen it pending for grace_seconds, which needs no clock
+    shared with the database, and staging files younger than grace_seconds are left alone.
+    """
+
+    def __init__(self, interval_seconds: float, grace_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.grace_seconds = grace_seconds
+        self._task: asyncio.Task | None = None
+        # file_id -> monotonic time it was first seen pending
+        self._pending_since = {}
+
+    def start(self):
+        if self._task is None and self.interval_seconds > 0:
+            self._task = asyncio.create_task(self._run())
+            logger.info("🧹 Document compaction every %ss", self.interval_seconds)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.error("❌ Document compaction failed: %s", e)
+
+    async def compact(self) -> dict:
+        removed = {"chunks": 0, "files": 0, "rows": 0, "staging": 0}
+        now = time.monotonic()
+        async with AsyncSessionLocal() as db:
+            pending = list((await db.execute(select(Document).where(Document.status == "pending"))).scalars())
+            self._pending_since = {document.file_id: self._pending_since.get(document.file_id, now) for document in pending}
+            for document in pending:
+                if now - self._pending_since[document.file_id] < self.grace_seconds:
+                    continue
+                removed["chunks"] += await asyncio.to_thread(delete_document_chunks, document.file_id)
+                if document.path and os.path.exists(document.path):
+                    os.remove(document.path)
+                    removed["files"] += 1
+                await db.delete(document)
+                removed["rows"] += 1
+                self._pending_since.pop(document.file_id)
+            await db.commit()
+
+        cutoff = time.time() - self.grace_seconds
+        if os.path.isdir(settings.UPLOAD_FOLDER):
+            for entry in os.scandir(settings.UPLOAD_FOLDER):
+                if entry.is_file() and entry.name.startswith(STAGING_PREFIX) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed["staging"] += 1
+
+        for kind, count in removed.items():
+            if count:
+                DOCUMENTS_COMPACTED.inc(count, kind=kind)
+        if any(removed.values()):
+            logger.info("🧹 Compaction removed %s interrupted uploads (%s chunks, %s files) and %s staging files", removed["rows"], removed["chunks"], removed["files"], removed["staging"])
+        return removed
+
+document_compactor = DocumentCompactor(
+    interval_seconds=settings.DOCUMENT_COMPACTION_INTERVAL_SECONDS,
+    grace_seconds=settings.DOCUMENT_ORPHAN_GRACE_SECONDS,
+)
@@ -1,25 +1,83 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey, Text, Float, UniqueConstraint
 from sqlalchemy.sql import func
 from db.database import Base
 
 class Document(Base):
     __tablename__ = "documents"
     id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(String(36), unique=True, index=True, nullable=True)
     filename = Column(String, nullable=False)
+    path = Column(String, nullable=True)
+    sha256 = Column(String(64), nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    chunk_count = Column(Integer, nullable=True)
+    # "pending" while an upload is being ingested, "ready" once it is indexed; NULL for rows that predate it
+    status = Column(String(16), nullable=True)
     extra_metadata = Column(JSON)
     created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self):
+        return {
+            "file_id": self.file_id,
+            "filename": self.filename,
+            "sha256": self.sha256,
+            "size_bytes": self.size_bytes,
+            "chunks": self.chunk_count,
+            "status": self.status or "ready",
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
 
 class Workflow(Base):
     __tablename__ = "workflows"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    structure = Column(JSON, nullable=False)  # nodes + edges
+    description = Column(Text, nullable=True)
+    structure = Column(JSON, nullable=False)  # nodes + edges of the current version
+    version = Column(Integer, nullable=False, default=1)
     created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "version": self.version,
+            "nodes": self.structure.get("nodes", []),
+            "edges": self.structure.get("edges", []),
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class WorkflowVersion(Base):
+    """Immutable snapshot of a workflow's graph; every update adds a row"""
+    __tablename__ = "workflow_versions"
+    __table_args__ = (UniqueConstraint("workflow_id", "version"),)
+    id = Column(Integer, primary_key=True, index=True)
+    workflow_id = Column(Integer, ForeignKey("workflows.id"), nullable=False, index=True)
+    version = Column(Integer, nullable=False)
+    structure = Column(JSON, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+    def to_dict(self):
+        return {
+            "workflow_id": self.workflow_id,
+            "version": self.version,
+            "nodes": self.structure.get("nodes", []),
+            "edges": self.structure.get("edges", []),
+            "created_at": self.created_at.isoformat() if self.created_at else None
+        }
 
 class ChatLog(Base):
     __tablename__ = "chat_logs"
     id = Column(Integer, primary_key=True, index=True)
     workflow_id = Column(Integer, ForeignKey("workflows.id"), nullable=True)
+    session_id = Column(String, index=True, nullable=True)
+    status = Column(String, nullable=True)
     query = Column(Text)
     response = Column(Text)
-    created_at = Column(DateTime, server_default=func.now())
+    latency_ms = Column(Float, nullable=True)
+    node_timings = Column(JSON, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), index=True)
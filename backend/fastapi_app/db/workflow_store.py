@@ -0,0 +1,80 @@
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import Workflow, WorkflowVersion
+from utils.logger import get_logger
+
+logger = get_logger("workflow_store")
+
+# Attempts at storing the next version when a concurrent update takes the same number
+UPDATE_ATTEMPTS = 3
+
+def _structure(workflow: dict) -> dict:
+    return {"nodes": workflow.get("nodes", []), "edges": workflow.get("edges", [])}
+
+async def create_workflow(db: AsyncSession, name: str, workflow: dict, description: str | None = None) -> Workflow:
+    """Save a new workflow as version 1"""
+    structure = _structure(workflow)
+    saved = Workflow(name=name, description=description, structure=structure, version=1)
+    db.add(saved)
+    await db.flush()
+    db.add(WorkflowVersion(workflow_id=saved.id, version=1, structure=structure))
+    await db.commit()
+    await db.refresh(saved)
+    logger.info("💾 Saved workflow %s (%s)", saved.id, name)
+    return saved
+
+async def get_workflow(db: AsyncSession, workflow_id: int) -> Workflow | None:
+    return await db.get(Workflow, workflow_id)
+
+async def list_workflows(db: AsyncSession, limit: int = 100, offset: int = 0) -> list:
+    result = await db.execute(select(Workflow).order_by(Workflow.id).limit(limit).offset(offset))
+    return list(result.scalars())
+
+async def update_workflow(db: AsyncSession, workflow_id: int, workflow: dict | None = None, name: str | None = None, description: str | None = None) -> Workflow | None:
+    """Apply changes to a saved workflow; a new graph is stored as the next version.
+
+    The row lock serializes updates on PostgreSQL, but SQLite ignores FOR UPDATE, so two
+    concurrent updates can both pick the same next version. The loser hits the
+    (workflow_id, version) unique constraint and is retried on top of the winner's version;
+    IntegrityError is raised only once UPDATE_ATTEMPTS are used up.
+    """
+    for attempt in range(1, UPDATE_ATTEMPTS + 1):
+        saved = await db.get(Workflow, workflow_id, with_for_update=True, populate_existing=True)
+        if saved is None:
+            return None
+
+        if name is not None:
+            saved.name = name
+        if description is not None:
+            saved.description = description
+        if workflow is not None:
+            structure = _structure(workflow)
+            saved.version += 1
+            saved.structure = structure
+            db.add(WorkflowVersion(workflow_id=saved.id, version=saved.version, structure=structure))
+
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            if attempt == UPDATE_ATTEMPTS:
+                raise
+            logger.warning("⚠️ Workflow %s was updated concurrently, retrying", workflow_id)
+            continue
+
+        await db.refresh(saved)
+        logger.info("💾 Updated workflow %s to version %s", saved.id, saved.version)
+        return saved
+
+async def get_workflow_version(db: AsyncSession, workflow_id: int, version: int) -> WorkflowVersion | None:
+    result = await db.execute(
+        select(WorkflowVersion).where(WorkflowVersion.workflow_id == workflow_id, WorkflowVersion.version == version)
+    )
+    return result.scalar_one_or_none()
+
+async def list_workflow_versions(db: AsyncSession, workflow_id: int) -> list:
+    result = await db.execute(
+        select(WorkflowVersion).where(WorkflowVersion.workflow_id == workflow_id).order_by(WorkflowVersion.version)
+    )
+    return list(result.scalars())
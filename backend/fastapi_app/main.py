@@ -1,10 +1,18 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import os
-from utils.logger import get_logger
+import time
+from utils.logger import get_logger, NonBlockingQueueHandler
 from utils.config import settings  
 from db import database, models
-from api import documents, workflows, llm
+from api import documents, workflows, llm, admin
+from core.admission import admission, AdmissionRejected
+from core.metrics import registry
+from core.embeddings import get_model_info
+from core.profiler import trace_sampler
+from db.chat_log_writer import chat_log_writer
+from db.document_compactor import document_compactor
 
 logger = get_logger("main")
 
@@ -23,22 +31,85 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+HTTP_REQUEST_SECONDS = registry.histogram("http_request_duration_seconds", "HTTP request latency by method, route and status")
+registry.gauge("log_records_dropped", "Log records dropped because the log queue was full", lambda: {(): NonBlockingQueueHandler.dropped})
+
+class RequestMetricsMiddleware:
+    """Time every request, labelled by route template so ids do not explode cardinality.
+
+    Plain ASGI rather than @app.middleware("http"): BaseHTTPMiddleware wraps receive, which
+    hides client disconnects from request.is_disconnected() and so from run cancellation.
+    """
+
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        started_at = time.perf_counter()
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started_at,
+                method=scope["method"],
+                route=route.path if route is not None else "unmatched",
+                status=status
+            )
+
+app.add_middleware(RequestMetricsMiddleware)
+
 app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
 app.include_router(workflows.router, prefix="/api/workflows", tags=["Workflows"])
 app.include_router(llm.router, prefix="/api/llm", tags=["LLM"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Shed load with a Retry-After hint instead of queueing without bound"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.reason, "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     """Initialize application on startup"""
     logger.info("Starting NoCode AI Builder Backend")
     
-    models.Base.metadata.create_all(bind=database.engine)
+    await database.create_tables()
     
     os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
     
+    if settings.CHAT_LOG_ENABLED:
+        chat_log_writer.start()
+    document_compactor.start()
+    trace_sampler.start()
+    
     logger.info("Application startup complete")
-    logger.info(f"Upload folder: {settings.UPLOAD_FOLDER}")
-    logger.info(f"CORS origins: {settings.get_cors_origins}")
+    logger.info("Upload folder: %s", settings.UPLOAD_FOLDER)
+    logger.info("CORS origins: %s", settings.get_cors_origins)
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Stop background tasks, flush buffered run records and release pooled connections"""
+    trace_sampler.stop()
+    await document_compactor.stop()
+    await chat_log_writer.stop()
+    await database.async_engine.dispose()
 
 @app.get("/")
 def root():
@@ -57,9 +128,20 @@ def health_check():
         "status": "healthy",
         "database": "connected" if database.engine else "disconnected",
         "upload_dir": "exists" if os.path.exists(settings.UPLOAD_FOLDER) else "missing",
+        "embeddings": get_model_info(),
         "cors_origins": settings.get_cors_origins
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics: span and node timings, token counts, cache hit ratios and queue depths"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admission")
+def admission_status():
+    """Run queue depth, wait times and rejection counts"""
+    return admission.stats()
+
 @app.get("/config")
 def show_config():
     """Show current configuration (for debugging)"""
@@ -1,25 +1,3 @@
-from sqlalchemy import Column, String, Text, JSON, DateTime
-from sqlalchemy.sql import func
-from db.database import Base
-
-class Workflow(Base):
-    __tablename__ = "workflows"
-    
-    id = Column(String(36), primary_key=True, index=True)
-    name = Column(String(255), nullable=False)
-    description = Column(Text)
-    nodes = Column(JSON, nullable=False)  
-    edges = Column(JSON, nullable=False)  
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-    
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "description": self.description,
-            "nodes": self.nodes,
-            "edges": self.edges,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+# The Workflow model lives in db/models.py alongside WorkflowVersion; this import is
+# kept so older code importing it from here keeps working against the same table
+from db.models import Workflow, WorkflowVersion
@@ -4,12 +4,101 @@ from typing import List
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./test.db"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    
+    CHAT_LOG_ENABLED: bool = True
+    CHAT_LOG_BATCH_SIZE: int = 100
+    CHAT_LOG_FLUSH_INTERVAL_SECONDS: float = 1.0
+    CHAT_LOG_QUEUE_SIZE: int = 10000
 
     GEMINI_API_KEY: str = ""
+    # Optional REST endpoint override, e.g. a local fake server for benchmarks
+    GEMINI_API_ENDPOINT: str = ""
     SERPAPI_KEY: str = ""
     
     CHROMADB_PATH: str = "./chroma_db"
+    # "sentence-transformers" (all-MiniLM-L6-v2, falls back to hashing if the model cannot load)
+    # or "hashing" (model-free character n-gram hashing, for tests and benchmarks)
+    EMBEDDING_BACKEND: str = "sentence-transformers"
     UPLOAD_FOLDER: str = "./uploads"
+    MAX_UPLOAD_BYTES: int = 200 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    # Text chunks embedded and written to ChromaDB per batch while ingesting a document
+    INGEST_BATCH_SIZE: int = 256
+    # Background sweep for chunks, files and rows left behind by interrupted uploads; 0 disables it
+    DOCUMENT_COMPACTION_INTERVAL_SECONDS: int = 3600
+    # Uploads pending for less than this, and staging files younger than it, are never treated as orphans
+    DOCUMENT_ORPHAN_GRACE_SECONDS: int = 3600
+    
+    BATCH_MAX_CONCURRENCY: int = 4
+    BATCH_MAX_QUERIES: int = 10000
+    BATCH_EMBED_SIZE: int = 64
+    
+    NODE_CACHE_SIZE: int = 512
+    NODE_CACHE_TTL_SECONDS: int = 3600
+    
+    RETRIEVAL_CACHE_SIZE: int = 1024
+    RETRIEVAL_CACHE_TTL_SECONDS: int = 3600
+    
+    # knowledgeBase defaults; nodes override with topK, contextBudget and mmrLambda
+    CONTEXT_BUDGET_CHARS: int = 6000
+    CONTEXT_MMR_LAMBDA: float = 0.7
+    # Candidates fetched per selected chunk, so MMR has alternatives to choose from
+    CONTEXT_FETCH_MULTIPLIER: int = 3
+    
+    # Compiled saved workflows; the TTL bounds how long another worker can serve a superseded version
+    WORKFLOW_CACHE_SIZE: int = 128
+    WORKFLOW_CACHE_TTL_SECONDS: int = 300
+    
+    WORKFLOW_RUN_TIMEOUT_SECONDS: float = 120.0
+    NODE_WORKER_THREADS: int = 32
+    
+    ADMISSION_MAX_CONCURRENT: int = 8
+    ADMISSION_MAX_QUEUE: int = 32
+    ADMISSION_TENANT_CONCURRENCY: int = 4
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 30.0
+    
+    SERPAPI_URL: str = "https://serpapi.com/search.json"
+    WEB_SEARCH_MAX_RESULTS: int = 3
+    WEB_SEARCH_TIMEOUT_SECONDS: float = 15.0
+    WEB_SEARCH_CACHE_SIZE: int = 256
+    WEB_SEARCH_CACHE_TTL_SECONDS: int = 900
+    WEB_SEARCH_POOL_SIZE: int = 10
+    
+    # Token budgets per session and per API key over a fixed window; 0 means unlimited.
+    # Session ids come from the client, so only the API key budget is enforceable (see UsageTracker)
+    USAGE_WINDOW_SECONDS: int = 86400
+    USAGE_SESSION_TOKEN_BUDGET: int = 0
+    USAGE_API_KEY_TOKEN_BUDGET: int = 0
+    USAGE_OVER_BUDGET: str = "downgrade"  # or "reject"
+    USAGE_DOWNGRADE_MODEL: str = "gemini-2.5-flash-lite"
+    USAGE_MAX_TRACKED: int = 10000
+    
+    # Model routing for LLM nodes with model "auto", and for avoiding degraded models
+    ROUTER_WINDOW: int = 200
+    ROUTER_WINDOW_SECONDS: int = 300
+    ROUTER_MIN_SAMPLES: int = 20
+    ROUTER_ERROR_RATE_THRESHOLD: float = 0.5
+    ROUTER_SMALL_PROMPT_TOKENS: int = 500
+    ROUTER_LARGE_PROMPT_TOKENS: int = 8000
+    ROUTER_DEFAULT_SLO_MS: float | None = None
+    
+    # X-Admin-Token for /api/admin; the admin API is disabled while this is empty
+    ADMIN_TOKEN: str = ""
+    # Workflow runs and uploads slower than this keep a timing breakdown and sampled stacks; 0 disables
+    PROFILE_SLOW_RUN_MS: int = 10000
+    # Stack sampling interval for traced runs; 0 keeps only span timings
+    PROFILE_SAMPLE_INTERVAL_MS: int = 20
+    PROFILE_MAX_CAPTURES: int = 50
+    PROFILE_MAX_SECONDS: int = 60
+    
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_DEBUG_SAMPLE_RATE: float = 1.0
+    LOG_MAX_MESSAGE_CHARS: int = 2000
     
     CLIENT_URL: str = "https://flow-mind-ai-tan.vercel.app"
     AUTH_URL: str = "https://flowmind-ai-auth.onrender.com"
@@ -1,11 +1,125 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
+import re
+import threading
+from utils.config import settings
+
+# Secrets that must never reach log output, matched anywhere in a formatted message
+_REDACTIONS = [
+    (re.compile(r"AIza[0-9A-Za-z\-_]{35}"), "AIza***"),
+    (re.compile(r"(?i)((?:api[_-]?key|serp_?api_?key|apikey|token|secret|password)[\"']?\s*[:=]\s*[\"']?)[^\s\"'&,}]+"), r"\1***"),
+    (re.compile(r"(?i)(bearer\s+)[A-Za-z0-9\-._~+/]+=*"), r"\1***"),
+]
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+_SAFE_ARG_TYPES = (str, int, float, bool, type(None))
+
+def redact(text: str) -> str:
+    for pattern, replacement in _REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+def _truncate(text: str, limit: int) -> str:
+    if limit and len(text) > limit:
+        return f"{text[:limit]}… [+{len(text) - limit} chars]"
+    return text
+
+class RedactingFormatter(logging.Formatter):
+    """Text formatter that truncates oversized messages and masks API keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.msg = _truncate(record.getMessage(), settings.LOG_MAX_MESSAGE_CHARS)
+        record.args = None
+        return redact(super().format(record))
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any fields passed through extra={...}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": _truncate(record.getMessage(), settings.LOG_MAX_MESSAGE_CHARS),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                payload[key] = value if isinstance(value, _SAFE_ARG_TYPES) else str(value)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return redact(json.dumps(payload, ensure_ascii=False, default=str))
+
+class DebugSampler(logging.Filter):
+    """Keep only a sample of DEBUG records so per-request debug lines stay affordable"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to a background listener without formatting them on the calling thread.
+
+    Records are dropped (and counted) rather than blocking when the queue is full.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Immutable args can be formatted later on the listener thread; anything else is
+        # rendered now so later mutation cannot change what gets logged
+        if record.args and not all(isinstance(arg, _SAFE_ARG_TYPES) for arg in record.args):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+_handler = None
+_listener = None
+_setup_lock = threading.Lock()
+
+def _shared_handler() -> logging.Handler:
+    """Create the process-wide queue handler and start its listener on first use"""
+    global _handler, _listener
+    with _setup_lock:
+        if _handler is not None:
+            return _handler
+
+        stream_handler = logging.StreamHandler()
+        if settings.LOG_FORMAT == "json":
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            fmt = "[%(asctime)s] [%(levelname)s] %(name)s: %(message)s"
+            stream_handler.setFormatter(RedactingFormatter(fmt, "%Y-%m-%d %H:%M:%S"))
+
+        log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        _handler = NonBlockingQueueHandler(log_queue)
+        _handler.addFilter(DebugSampler(settings.LOG_DEBUG_SAMPLE_RATE))
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _handler
 
 def get_logger(name: str):
     logger = logging.getLogger(name)
     if not logger.handlers:
-        handler = logging.StreamHandler()
-        fmt = "[%(asctime)s] [%(levelname)s] %(name)s: %(message)s"
-        handler.setFormatter(logging.Formatter(fmt, "%Y-%m-%d %H:%M:%S"))
-        logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
+        logger.addHandler(_shared_handler())
+        logger.setLevel(settings.LOG_LEVEL.upper())
+        logger.propagate = False
     return logger
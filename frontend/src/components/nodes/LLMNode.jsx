@@ -105,6 +105,7 @@ USER QUERY: {query}`;
   };
 
   const modelOptions = [
+    { value: "auto", label: "Auto (Routed by Prompt Size & Latency)" },
     { value: "gemini-2.5-pro", label: "Gemini 2.5 Pro (Most Advanced)" },
     {
       value: "gemini-2.5-flash",